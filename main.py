@@ -1,34 +1,121 @@
-from tools.kannadaTools import load_inscription_data, get_misread_dict, clean_inscription_text, compare_and_highlight_lines, count_aksharas_per_line, predict_misreads, tokenize_kannada
+import codecs
+from contextlib import asynccontextmanager
+from typing import Optional
 
-from fastapi import FastAPI
+from tools.kannadaTools import clean_inscription_text, compare_and_highlight_lines, count_aksharas_per_line, diff_inscriptions, inscription_diff_to_dict, iter_misread_json_lines, line_diff_cache, LineSplitter, predict_misreads, scan_misreads, suggest_corrections, suggest_expert_words, tokenize_kannada, TOKENIZER_BACKENDS
+from tools.misreadService import MisreadIndexService
+
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 
 # Define allowed origins
 origins = [ "http://localhost:5173", 
            "https://mythicsociety.github.io/"]
 
-app = FastAPI()
+# Misread index shared by every request, loaded once per process
+misread_service = MisreadIndexService()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    misread_service.refresh_in_background()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware( CORSMiddleware, 
                    allow_origins=origins, 
                    allow_credentials=True, 
                    allow_methods=["*"], 
                    allow_headers=["*"], )
 
+@app.get('/ready')
+def ready():
+    if not misread_service.ready:
+        error = misread_service.last_error
+        return JSONResponse(status_code=503, content={"ready": False, "error": str(error) if error else None})
+
+    snapshot = misread_service.snapshot
+    return {"ready": True, "corpus_version": snapshot.corpus_version, "loaded_at": snapshot.loaded_at}
+
+@app.post('/reload_misreads')
+def reload_misreads():
+    try:
+        reloaded = misread_service.refresh()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Could not reload the inscription data: {e}")
+
+    return {"reloaded": reloaded, "corpus_version": misread_service.snapshot.corpus_version}
+
 @app.get('/predict_misreads')
-def base(sentence: str):
-    # Load the DataFrame
-    df = load_inscription_data()
+def base(sentence: str, scored: bool = False, top_k: Optional[int] = Query(None, ge=1)):
+    if not misread_service.ready:
+        raise HTTPException(status_code=503, detail="The misread index is still loading")
 
-    # Create misread dictionary 
-    misread_dict = get_misread_dict(df)
+    snapshot = misread_service.snapshot
+    if scored:
+        result = predict_misreads(sentence, snapshot.confusion_matrix, top_k, snapshot.misread_automaton)
+        return {token: [correction._asdict() for correction in corrections] for token, corrections in result.items()}
 
-    result = predict_misreads(sentence, misread_dict) 
+    result = predict_misreads(sentence, snapshot.misread_dict, top_k, snapshot.misread_automaton) 
     
     return result
 
+@app.get('/nearest_words')
+def nearest_words(sentence: str, max_distance: Optional[int] = None, limit: int = 5):
+    if not misread_service.ready:
+        raise HTTPException(status_code=503, detail="The misread index is still loading")
+
+    result = suggest_expert_words(sentence, misread_service.snapshot.expert_lexicon, max_distance, limit)
+    return {word: [match._asdict() for match in matches] for word, matches in result.items()}
+
+@app.get('/suggest_corrections')
+def corrections(word: str, top_k: int = Query(5, ge=1), beam_width: int = 32):
+    if not misread_service.ready:
+        raise HTTPException(status_code=503, detail="The misread index is still loading")
+
+    snapshot = misread_service.snapshot
+    result = suggest_corrections(word, snapshot.reverse_confusion_matrix, snapshot.expert_lexicon, top_k, beam_width)
+    return [candidate._asdict() for candidate in result]
+
+# Scans the text in the request body line by line, streaming one JSON object per misread found (NDJSON)
+@app.post('/scan_misreads')
+async def scan_misreads_stream(request: Request, scored: bool = False, top_k: Optional[int] = Query(None, ge=1)):
+    if not misread_service.ready:
+        raise HTTPException(status_code=503, detail="The misread index is still loading")
+
+    snapshot = misread_service.snapshot
+    misread_dict = snapshot.confusion_matrix if scored else snapshot.misread_dict
+    return BodyStreamingResponse(iter_scanned_body(request.stream(), misread_dict, snapshot.misread_automaton, top_k),
+                                 media_type='application/x-ndjson')
+
+class BodyStreamingResponse(StreamingResponse):
+    # Streams while the request body is still being read. StreamingResponse would also listen
+    # for the client disconnecting, taking the body's messages off the same receive channel.
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+async def iter_scanned_body(body, misread_dict, misread_automaton, top_k):
+    # The body is decoded and split into lines as it arrives, each batch of complete lines is
+    # scanned straight away, so only the line still being received is held in memory
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    line_splitter = LineSplitter()
+    line_number = 1
+    async for chunk in body:
+        lines = line_splitter.feed(decoder.decode(chunk))
+        for json_line in iter_misread_json_lines(scan_misreads(lines, misread_dict, misread_automaton, top_k, line_number)):
+            yield json_line
+        line_number += len(lines)
+
+    lines = line_splitter.feed(decoder.decode(b'', final=True)) + line_splitter.close()
+    for json_line in iter_misread_json_lines(scan_misreads(lines, misread_dict, misread_automaton, top_k, line_number)):
+        yield json_line
+
 @app.get('/tokenize_kannada')
-def base(sentence: str):
-    result = tokenize_kannada(sentence) 
+def base(sentence: str, backend: str = 'table'):
+    if backend not in TOKENIZER_BACKENDS:
+        raise HTTPException(status_code=400, detail=f"backend must be one of {', '.join(TOKENIZER_BACKENDS)}")
+
+    result = tokenize_kannada(sentence, backend=backend) 
     
     return result
 
@@ -37,3 +124,11 @@ def base(sentence: str):
     result = count_aksharas_per_line(sentence) 
     
     return result
+
+@app.get('/compare_inscriptions')
+def compare_inscriptions(text1: str, text2: str):
+    return inscription_diff_to_dict(diff_inscriptions(text1, text2))
+
+@app.get('/line_diff_cache')
+def line_diff_cache_stats():
+    return line_diff_cache.stats()._asdict()
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
 import re
-from tools.kannadaTools import clean_inscription_text, compare_and_highlight_lines, count_aksharas_per_line, predict_misreads, load_inscription_data, get_misread_dict
+from tools.kannadaTools import count_aksharas_per_line, diff_inscriptions, line_range, predict_misreads, load_misread_index, render_differences, render_highlighted_input_line, render_highlighted_line
 
 # Constants 
 INSCRIPTION_1_COLOR = "#FF0000"
@@ -15,23 +15,14 @@ repo_url = "https://github.com/mythicsociety/KannadaTools"
 # Define the URL you want to link to
 levenshtein_url = "https://en.wikipedia.org/wiki/Levenshtein_distance"  
 
-# Load data (with caching) 
-@st.cache_data(ttl=3600)
-def load_data():
-    """Loads inscription data from the Excel file."""
-    return load_inscription_data()
+# Load misread dictionary (with caching) 
+@st.cache_resource(ttl=3600)
+def get_dict():
+    """Loads the dictionary of misread aksharas and their corrections from the compiled misread index."""
+    return load_misread_index().misread_dict
 
-# Create misread dictionary (with caching) 
-@st.cache_resource
-def get_dict(dataframe):
-    """Creates a dictionary of misread aksharas and their corrections."""
-    return get_misread_dict(dataframe)
-
-# Load the DataFrame
-df = load_data()
-
-# Create misread dictionary 
-misread_dict = get_dict(df)
+# Load misread dictionary 
+misread_dict = get_dict()
 
 # Streamlit UI
 st.markdown("""
@@ -138,48 +129,44 @@ with st.expander(""):
             try:
                 if inscription_1_text:
                     line_akshara_counts1, total_aksharas1, num_lines1 = count_aksharas_per_line(inscription_1_text) 
-                    lines1 = inscription_1_text.splitlines() 
                 else:
                     total_aksharas1 = 0
                     num_lines1 = 0
-                    lines1 = []
 
                 if inscription_2_text:
                     line_akshara_counts2, total_aksharas2, num_lines2 = count_aksharas_per_line(inscription_2_text) 
-                    lines2 = inscription_2_text.splitlines()
                 else:
                     total_aksharas2 = 0
                     num_lines2 = 0
-                    lines2 = []
 
                 st.write(f"Inscription 1 contains {total_aksharas1} aksharas in {num_lines1} lines")
                 st.write(f"Inscription 2 contains {total_aksharas2} aksharas in {num_lines2} lines")
 
                 with st.spinner("Comparing inscriptions..."):
-                    comparison_results, total_differences = compare_and_highlight_lines(inscription_1_text, inscription_2_text, color1, color2)
-
-                # Display original and cleaned lines along with the side-by-side comparison
-                max_len = max(len(lines1), len(lines2))
-                for i in range(max_len):
-                    line1 = lines1[i] if i < len(lines1) else ""
-                    line2 = lines2[i] if i < len(lines2) else ""
-                    cleaned_line1 = clean_inscription_text(line1)
-                    cleaned_line2 = clean_inscription_text(line2)
-
-                    # Get highlighted_line2 from comparison_results
-                    _, _, _, highlighted_line2, differences, line_differences = comparison_results[i]
+                    inscription_diff = diff_inscriptions(inscription_1_text, inscription_2_text)
+                    total_differences = inscription_diff.total_differences
+
+                # Display original and cleaned lines along with the side-by-side comparison.
+                # Lines are aligned first, so a row may hold a missing, split or merged line
+                # and is numbered with the lines of each inscription it holds.
+                for line_diff, (_, i1, i2, j1, j2) in zip(inscription_diff.line_diffs, inscription_diff.line_alignment):
+                    line1, cleaned_line1, line_differences = line_diff.line1, line_diff.cleaned_line1, line_diff.line_differences
+                    highlighted_line2 = render_highlighted_line(line_diff, color1, color2)
+                    differences = render_differences(line_diff, color1, color2)
+                    # The same highlights drawn on inscription 2 as it was typed
+                    highlighted_input2 = render_highlighted_input_line(line_diff, color1, color2)
 
                     # Rearrange columns: Line Number, Original 1, Original 2, Cleaned 1, Highlighted 2
                     col0, col1, col3, col2, col4 = st.columns(5)  # Added col0 for line number
 
                     with col0:
-                        st.write(f"**{i + 1}**")  # Display line number only once
+                        st.write(f"**{line_range(i1, i2)} / {line_range(j1, j2)}**")  # Display line numbers only once
 
                     with col1:
                         st.write(f"As input in inscription 1: {line1}") 
 
                     with col3:
-                        st.write(f"As input in inscription 2: {line2}") 
+                        st.markdown(f"<p>As input in inscription 2: {highlighted_input2}</p>", unsafe_allow_html=True) 
 
                     with col2:
                         st.write(f"As processed for inscription 1: <span style='color:{color1}'>{cleaned_line1}</span>", unsafe_allow_html=True)
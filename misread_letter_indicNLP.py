@@ -7,6 +7,8 @@ import Levenshtein
 # Import from Indic NLP Library
 from indicnlp.tokenize import indic_tokenize  
 
+from tools.misreadIndex import build_misread_dict, count_misread_pairs
+
 # Define constants for file URLs and other frequently used values
 FILE_URL = "https://github.com/mythicsociety/KannadaTools/raw/94814a2766fd22e89e24976eded769d45a82560a/mythic_society%20(1).xlsx"
 INSCRIPTION_1_COLOR = "#FF0000"  # Default color for Inscription 1
@@ -84,21 +86,9 @@ def create_miss_read_dict_cached(df):
         df: The pandas DataFrame containing the misread and corrected aksharas.
 
     Returns:
-        A dictionary where keys are misread aksharas and values are lists of possible corrections.
+        A read-only mapping where keys are misread aksharas and values are tuples of possible corrections, most frequent first.
     """
-    miss_read_dict = {}
-    for _, row in df.iterrows():
-        miss_read_akshara = row['different_aksharas_in_sentence1']
-        corrected_letter = row['different_aksharas_in_sentence2']
-
-        if pd.notna(miss_read_akshara) and pd.notna(corrected_letter):
-            if miss_read_akshara not in miss_read_dict:
-                miss_read_dict[miss_read_akshara] = [corrected_letter]
-            else:
-                if corrected_letter not in miss_read_dict[miss_read_akshara]:
-                    miss_read_dict[miss_read_akshara].append(corrected_letter)
-
-    return miss_read_dict
+    return build_misread_dict(count_misread_pairs(df))
 
 # Function to predict possible miss-reads in a sentence
 def predict_miss_read(sentence, miss_read_dict):
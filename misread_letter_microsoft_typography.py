@@ -4,6 +4,8 @@ import re
 import unicodedata
 import Levenshtein
 
+from tools.misreadIndex import build_misread_dict, count_misread_pairs
+
 # Constants 
 DATA_FILE_URL = "https://github.com/mythicsociety/KannadaTools/raw/94814a2766fd22e89e24976eded769d45a82560a/mythic_society%20(1).xlsx"
 INSCRIPTION_1_COLOR = "#FF0000"
@@ -71,20 +73,8 @@ def tokenize_kannada(text, preserve_whitespace=False):
 # Create misread dictionary (with caching) 
 @st.cache_resource
 def get_misread_dict(dataframe):
-    """Creates a dictionary of misread aksharas and their corrections."""
-    misread_dict = {}
-    for _, row in dataframe.iterrows():
-        misread_akshara = row['different_aksharas_in_sentence1']
-        corrected_akshara = row['different_aksharas_in_sentence2']
-
-        if pd.notna(misread_akshara) and pd.notna(corrected_akshara):
-            if misread_akshara not in misread_dict:
-                misread_dict[misread_akshara] = [corrected_akshara]
-            else:
-                if corrected_akshara not in misread_dict[misread_akshara]:
-                    misread_dict[misread_akshara].append(corrected_akshara)
-
-    return misread_dict
+    """Creates a read-only dictionary of misread aksharas and their corrections, most frequent correction first."""
+    return build_misread_dict(count_misread_pairs(dataframe))
 
 # Predict potential misreads 
 def predict_misreads(sentence, misread_dict):
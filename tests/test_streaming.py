@@ -0,0 +1,59 @@
+import io
+
+import pytest
+
+from tests.test_tokenizer_parity import EDGE_CASES, corpus_readings
+from tools.aksharaTokenizer import VIRAMA, ZWNJ, iter_aksharas, tokenize_aksharas
+from tools.kannadaTools import count_aksharas_per_line, iter_line_counts
+
+# Chunk sizes small enough to cut every akshara, line break and bracket in two
+CHUNK_SIZES = [1, 2, 3]
+
+# Readings of the corpus streamed as one text, enough to cover its aksharas without a slow test
+CORPUS_SAMPLE_SIZE = 300
+
+# Multi-line texts with line breaks, brackets and blank lines that a chunk boundary can split
+LINE_CASES = [
+    'ಶ್ರೀ ಸ್ವಸ್ತಿ\nಕನ್ನಡ',
+    'ಶ್ರೀ\r\nಸ್ವಸ್ತಿ\r\n',
+    'ಕನ್ನಡ\r\rದೇವ\n\nಶ್ರೀ\n',
+    '\n\n ಕ \n',
+    'ಶ್ರೀ [ಸ್ವ\nಸ್ತಿ] ಕನ್ನಡ\n(ದೇ)ವ [ಶ್ರೀ',
+    'ಕ[ಷ]್ಷ (ಕ)ನ್ನಡ',
+    f'ಕ{VIRAMA}\nಷ{ZWNJ}ಕ\x0b𑌕ಾ ದೇವ',
+]
+
+def _open(text, binary):
+    return io.BytesIO(text.encode('utf-8')) if binary else io.StringIO(text)
+
+def _line_counts(text):
+    return count_aksharas_per_line(text)[0]
+
+@pytest.mark.parametrize('binary', [False, True])
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+@pytest.mark.parametrize('preserve_whitespace', [False, True])
+def test_iter_aksharas_matches_tokenizer(chunk_size, binary, preserve_whitespace):
+    for text in EDGE_CASES + LINE_CASES:
+        streamed = list(iter_aksharas(_open(text, binary), preserve_whitespace, chunk_size))
+        assert streamed == tokenize_aksharas(text, preserve_whitespace), text
+
+@pytest.mark.parametrize('binary', [False, True])
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_iter_line_counts_matches_line_counts(chunk_size, binary):
+    for text in EDGE_CASES + LINE_CASES:
+        streamed = [count for _, count in iter_line_counts(_open(text, binary), chunk_size)]
+        assert streamed == _line_counts(text), text
+
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_iter_line_counts_numbers_lines(chunk_size):
+    text = LINE_CASES[2]
+    counted = list(iter_line_counts(io.StringIO(text), chunk_size, blank_lines=True))
+    assert [line_number for line_number, _ in counted] == list(range(1, len(text.splitlines()) + 1))
+    assert [count for _, count in counted if count] == _line_counts(text)
+
+@pytest.mark.parametrize('binary', [False, True])
+@pytest.mark.parametrize('chunk_size', CHUNK_SIZES)
+def test_streamed_corpus(chunk_size, binary, corpus_readings):
+    text = '\n'.join(corpus_readings[:CORPUS_SAMPLE_SIZE])
+    assert list(iter_aksharas(_open(text, binary), chunk_size=chunk_size)) == tokenize_aksharas(text)
+    assert [count for _, count in iter_line_counts(_open(text, binary), chunk_size)] == _line_counts(text)
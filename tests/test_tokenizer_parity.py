@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from tools.aksharaTokenizer import (TOKENIZER_BACKENDS, VIRAMA, ZWJ, ZWNJ, find_parity_mismatches, regex_segment_aksharas,
+                                    segment_aksharas, tokenize_aksharas)
+from tools.workbookReader import iter_workbook_rows
+
+WORKBOOK_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mythic_society.xlsx')
+
+# Every segmenter checked against the reference: the backends, and the table segmenter without its word cache
+TOKENIZERS = {**TOKENIZER_BACKENDS, 'table_uncached': segment_aksharas}
+
+EDGE_CASES = [
+    '',
+    ' ',
+    # Zero width non-joiner and joiner, alone, between aksharas, before marks and at the ends
+    ZWNJ,
+    f'ಕ{ZWNJ}ಷ',
+    f'ಕ್{ZWNJ}ಷ',
+    f'{ZWNJ}ಾ',
+    f'ಕ{ZWNJ}',
+    f'ಕ್{ZWJ}ಷ',
+    f'{ZWJ}ಕ',
+    # Orphan viramas: at the start, doubled, at the end, before whitespace, a digit or a mark
+    VIRAMA,
+    f'{VIRAMA}ಕ',
+    f'ಕ{VIRAMA}{VIRAMA}ಷ',
+    f'ಕನ್ನಡ{VIRAMA}',
+    f'ಕ{VIRAMA} ಷ',
+    f'ಕ{VIRAMA}೧',
+    f'ಕ{VIRAMA}ಾ',
+    # Whitespace followed by marks
+    ' ಾ',
+    'ಕ ಿ ಷ',
+    '\tೃ\n್ಕ',
+    'ಕನ್ನಡ  ಼ಾ',
+    # Characters outside the Basic Multilingual Plane, with and without marks after them
+    '𑌕',
+    'ಕ𑌕ಾ',
+    '𑌕ಿಷ್𝐀',
+    'ಕನ್ನಡ 😀́ ಶ್ರೀ',
+    '\U00020000್ಕ',
+    # Mixed scripts, digits and the pipe symbol
+    'ಶ್ರೀ | abc ೧೨ ದೇವ।',
+    'स्त्री ಸ್ತ್ರೀ',
+]
+
+@pytest.fixture(scope='module')
+def corpus_readings():
+    if not os.path.exists(WORKBOOK_PATH):
+        pytest.skip(f"{WORKBOOK_PATH} is not available")
+    return [reading for row in iter_workbook_rows(WORKBOOK_PATH, ['Expert_Reading', 'Our_Reading'])
+            for reading in row if isinstance(reading, str)]
+
+@pytest.mark.parametrize('name', TOKENIZERS)
+def test_corpus_parity(name, corpus_readings):
+    assert find_parity_mismatches(corpus_readings, TOKENIZERS[name]) == []
+
+@pytest.mark.parametrize('name', TOKENIZERS)
+def test_edge_case_parity(name):
+    assert find_parity_mismatches(EDGE_CASES, TOKENIZERS[name]) == []
+
+def test_cached_segmenter_repeats_itself():
+    # The second pass is served from the word cache filled by the first
+    first = [tokenize_aksharas(text, True) for text in EDGE_CASES]
+    assert [tokenize_aksharas(text, True) for text in EDGE_CASES] == first
+
+def test_whole_corpus_at_once(corpus_readings):
+    corpus = '\n'.join(corpus_readings)
+    assert tokenize_aksharas(corpus) == segment_aksharas(corpus) == regex_segment_aksharas(corpus)
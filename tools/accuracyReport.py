@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from tools.kannadaTools import (DATA_FILE_URL, TOKENIZER_VERSION, count_aksharas, diff_inscriptions, get_corpus_version,
+                                iter_distinct_rows, iter_workbook_rows, read_workbook_bytes)
+from tools.batchTools import DEFAULT_CHUNK_SIZE
+from tools.corpusCache import load_corpus_json, read_corpus_json, save_corpus_json
+
+# Constants
+REPORT_COLUMNS = (
+    'Inscription_Name',
+    'Expert_Reading',
+    'Our_Reading',
+    'Year',
+    'Surface Quality (Well dressed/Moderately Dressed/Poorly Dressed)',
+)
+YEAR_BUCKET_SIZE = 100
+UNKNOWN_GROUP = 'Unknown'
+DEFAULT_REPORT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mythic_society.accuracy.json')
+# Bumped whenever a change to the report or to the comparison would give different numbers
+REPORT_FORMAT_VERSION = 2
+
+# Totals of one group of lines. rows is the number of distinct lines (a line repeated over several
+# workbook rows counts once), rate is differences per expert akshara over all of them (None if they
+# have no aksharas).
+AccuracyStats = namedtuple('AccuracyStats', ['rows', 'expert_aksharas', 'differences', 'rate'])
+
+def _accuracy_stats(rows, expert_aksharas, differences):
+    return AccuracyStats(rows, expert_aksharas, differences, differences / expert_aksharas if expert_aksharas else None)
+
+# Accuracy of Our_Reading against Expert_Reading, overall and rolled up by inscription, year
+# bucket and surface quality, each a {group: AccuracyStats} dict. Inscriptions and surface qualities
+# are in order of first appearance, year buckets in chronological order.
+# Every line is diffed once, however many curated misread pairs repeat it in the workbook. Lines
+# without both readings are counted in skipped_rows and left out of every total.
+AccuracyReport = namedtuple('AccuracyReport', ['corpus_version', 'overall', 'by_inscription', 'by_year',
+                                               'by_surface_quality', 'skipped_rows'])
+
+def year_bucket_start(year, bucket_size=YEAR_BUCKET_SIZE):
+    """Returns the first year of the span of years a year falls in, or None if the year is not a number."""
+    if isinstance(year, str):
+        year = year.strip()
+        if not year.lstrip('-').isdigit():
+            return None
+    elif not isinstance(year, (int, float)) or year != year:
+        return None
+    return int(year) // bucket_size * bucket_size
+
+def year_bucket(year, bucket_size=YEAR_BUCKET_SIZE):
+    """Returns the label of the span of years a year falls in, e.g. '1400-1499'."""
+    start = year_bucket_start(year, bucket_size)
+    if start is None:
+        return UNKNOWN_GROUP
+    return f"{start}-{start + bucket_size - 1}"
+
+def _group_name(value):
+    if isinstance(value, str) and value.strip():
+        return value.strip()
+    return UNKNOWN_GROUP
+
+def _diff_row(readings):
+    # Number of expert aksharas and of differing aksharas in one row
+    expert_reading, our_reading = readings
+    return count_aksharas(expert_reading), diff_inscriptions(expert_reading, our_reading).total_differences
+
+def _roll_up(groups, row_results):
+    totals = {}
+    for group, (expert_aksharas, differences) in zip(groups, row_results):
+        rows, group_aksharas, group_differences = totals.get(group, (0, 0, 0))
+        totals[group] = (rows + 1, group_aksharas + expert_aksharas, group_differences + differences)
+    return {group: _accuracy_stats(*total) for group, total in totals.items()}
+
+def _roll_up_years(bucket_starts, row_results):
+    # Sorted on the first year of each bucket, unknown years last, and only then labelled
+    totals = _roll_up(bucket_starts, row_results)
+    order = sorted(totals, key=lambda start: (start is None, start or 0))
+    return {year_bucket(start): totals[start] for start in order}
+
+def build_accuracy_report(workbook_bytes, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Diffs Expert_Reading against Our_Reading for every distinct line of the workbook on a process pool.
+
+    The workbook repeats a line once for every curated misread pair on it, so rows are
+    deduplicated on (Inscription_Name, Expert_Reading, Our_Reading) first. Otherwise lines
+    with more misreads would count more times and inflate the rate.
+
+    Args:
+        workbook_bytes: Raw bytes of the inscription workbook.
+        workers: Number of worker processes, defaults to the number of CPUs. 1 diffs in this process.
+        chunk_size: Number of lines sent to a worker at a time.
+
+    Returns:
+        An AccuracyReport.
+    """
+    rows = []
+    skipped_rows = 0
+    workbook_rows = iter_workbook_rows(workbook_bytes, REPORT_COLUMNS)
+    for name, expert_reading, our_reading, year, surface_quality in iter_distinct_rows(workbook_rows, key=lambda row: row[:3]):
+        if isinstance(expert_reading, str) and isinstance(our_reading, str):
+            rows.append((_group_name(name), expert_reading, our_reading, year_bucket_start(year), _group_name(surface_quality)))
+        else:
+            skipped_rows += 1
+
+    readings = [(expert_reading, our_reading) for _, expert_reading, our_reading, _, _ in rows]
+    if workers == 1:
+        row_results = list(map(_diff_row, readings))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            row_results = list(executor.map(_diff_row, readings, chunksize=chunk_size))
+
+    overall = _roll_up([None] * len(rows), row_results).get(None, _accuracy_stats(0, 0, 0))
+    return AccuracyReport(get_corpus_version(workbook_bytes), overall,
+                          _roll_up([row[0] for row in rows], row_results),
+                          _roll_up_years([row[3] for row in rows], row_results),
+                          _roll_up([row[4] for row in rows], row_results),
+                          skipped_rows)
+
+_REPORT_FORMAT = f"{REPORT_FORMAT_VERSION}/{TOKENIZER_VERSION}"
+
+def accuracy_report_to_dict(report):
+    """Returns the report as plain dicts, ready for JSON."""
+    content = report._asdict()
+    content['overall'] = report.overall._asdict()
+    for field in ('by_inscription', 'by_year', 'by_surface_quality'):
+        content[field] = {group: stats._asdict() for group, stats in content[field].items()}
+    return content
+
+def _accuracy_report_from_dict(content):
+    return AccuracyReport(content['corpus_version'], AccuracyStats(**content['overall']),
+                          *({group: AccuracyStats(**stats) for group, stats in content[field].items()}
+                            for field in ('by_inscription', 'by_year', 'by_surface_quality')),
+                          content['skipped_rows'])
+
+def save_accuracy_report(report, path):
+    """Writes the report to path as JSON, replacing any previous file atomically."""
+    save_corpus_json(path, report.corpus_version, _REPORT_FORMAT, accuracy_report_to_dict(report), indent=1)
+
+def read_accuracy_report(path):
+    """Reads a report written by save_accuracy_report(). Raises ValueError if the file is not a valid report."""
+    return read_corpus_json(path, _REPORT_FORMAT, _accuracy_report_from_dict)[1]
+
+def load_accuracy_report(workbook_source=DATA_FILE_URL, report_path=DEFAULT_REPORT_PATH, workbook_bytes=None, workers=None):
+    """
+    Loads the accuracy report, diffing the corpus again only when the workbook content changed.
+
+    Args:
+        workbook_source: URL or path of the inscription workbook.
+        report_path: Location of the cached report.
+        workbook_bytes: Already downloaded workbook content, used instead of workbook_source.
+        workers: Number of worker processes if the report has to be built.
+
+    Returns:
+        An AccuracyReport matching the current workbook.
+    """
+    if workbook_bytes is None:
+        workbook_bytes = read_workbook_bytes(workbook_source)
+    return load_corpus_json(report_path, get_corpus_version(workbook_bytes), _REPORT_FORMAT,
+                            lambda: build_accuracy_report(workbook_bytes, workers),
+                            accuracy_report_to_dict, _accuracy_report_from_dict, indent=1)
+
+def _print_stats(title, stats_by_group, output):
+    print(f"\n{title}", file=output)
+    for group, stats in stats_by_group.items():
+        rate = '-' if stats.rate is None else f"{stats.rate:.2%}"
+        print(f"  {group}: {rate} ({stats.differences} of {stats.expert_aksharas} aksharas, {stats.rows} lines)", file=output)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report how far Our_Reading is from Expert_Reading across the inscription workbook.")
+    parser.add_argument('--workbook', default=DATA_FILE_URL, help="URL or path of the inscription workbook")
+    parser.add_argument('--output', default=DEFAULT_REPORT_PATH, help="where to cache the report")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--force', action='store_true', help="rebuild even if the cached report is up to date")
+    parser.add_argument('--json', action='store_true', help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    workbook_bytes = read_workbook_bytes(args.workbook)
+    if args.force and os.path.exists(args.output):
+        os.remove(args.output)
+
+    start = time.perf_counter()
+    report = load_accuracy_report(report_path=args.output, workbook_bytes=workbook_bytes, workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    if args.json:
+        json.dump(accuracy_report_to_dict(report), sys.stdout, ensure_ascii=False, indent=1)
+        sys.stdout.write('\n')
+    else:
+        _print_stats("Overall", {'All lines': report.overall}, sys.stdout)
+        _print_stats("By year", report.by_year, sys.stdout)
+        _print_stats("By surface quality", report.by_surface_quality, sys.stdout)
+        _print_stats("By inscription", report.by_inscription, sys.stdout)
+    print(f"Accuracy report {report.corpus_version}: {report.overall.rows} lines, {report.skipped_rows} skipped, "
+          f"loaded in {elapsed:.2f}s", file=sys.stderr)
+
+# Entry point when the module is executed as a script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import heapq
+from collections import namedtuple
+
+import Levenshtein
+
+from tools.aksharaTokenizer import tokenize_aksharas
+from tools.aksharaVocabulary import AksharaVocabulary
+
+# Constants
+LEXICON_MAX_DISTANCE = 2
+# Only the first aksharas of a word are indexed, which bounds the index size for long words
+LEXICON_PREFIX_LENGTH = 7
+LEXICON_LIMIT = 5
+# Partial corrections kept after each akshara of a word
+CORRECTION_BEAM_WIDTH = 32
+
+# An attested word near the one looked up: its akshara edit distance and how often it is attested
+LexiconMatch = namedtuple('LexiconMatch', ['word', 'distance', 'count'])
+# An attested word reached by substituting aksharas of a word: score is the product of the
+# substitution probabilities, substitutions the (offset, akshara, replacement) triples applied
+CorrectionCandidate = namedtuple('CorrectionCandidate', ['word', 'score', 'count', 'substitutions'])
+
+def _deletes(code_string, max_deletes):
+    # Every string left after deleting up to max_deletes characters, code_string included
+    deletes = {code_string}
+    frontier = [code_string]
+    for _ in range(max_deletes):
+        next_frontier = []
+        for string in frontier:
+            for index in range(len(string)):
+                deleted = string[:index] + string[index + 1:]
+                if deleted not in deletes:
+                    deletes.add(deleted)
+                    next_frontier.append(deleted)
+        frontier = next_frontier
+    return deletes
+
+class AksharaLexicon:
+    """
+    Attested words indexed for approximate lookup at akshara edit distance (symmetric delete, as in SymSpell).
+
+    Every word is indexed under each string left after deleting up to max_distance aksharas
+    from its prefix. A lookup generates the same deletes of the word looked up, so only
+    words sharing one of them are compared, and no comparison runs against the whole
+    lexicon. Words are compared as code strings with one character per akshara.
+    Read-only once built.
+    """
+
+    def __init__(self, word_counts, max_distance=LEXICON_MAX_DISTANCE, prefix_length=LEXICON_PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.words = []
+        self.counts = []
+        self._codes = []
+        self._vocabulary = AksharaVocabulary()
+        self._word_ids = {}
+        self._index = {}
+        self._trie = None
+        for word, count in word_counts.items():
+            self._add(word, count)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return self._vocabulary.encode_known(tokenize_aksharas(word)) in self._word_ids
+
+    def _add(self, word, count):
+        code_string = self._vocabulary.encode(tokenize_aksharas(word))
+        if not code_string:
+            return
+        word_id = self._word_ids.get(code_string)
+        if word_id is not None:
+            # Spelled differently (e.g. with a non-joiner) but the same aksharas
+            self.counts[word_id] += count
+            return
+        word_id = self._word_ids[code_string] = len(self.words)
+        self.words.append(word)
+        self.counts.append(count)
+        self._codes.append(code_string)
+        for deleted in _deletes(code_string[:self.prefix_length], self.max_distance):
+            self._index.setdefault(deleted, []).append(word_id)
+
+    def lookup(self, word, max_distance=None, limit=LEXICON_LIMIT):
+        """
+        Finds the attested words closest to word.
+
+        Args:
+            word: The word to look up.
+            max_distance: Largest akshara edit distance of interest, at most (and by default) the one the lexicon was built for.
+            limit: Number of words to return, None for all within max_distance.
+
+        Returns:
+            A list of LexiconMatch, closest first, then most attested first.
+        """
+        max_distance = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        code_string = self._vocabulary.encode_known(tokenize_aksharas(word))
+        if not code_string:
+            return []
+
+        codes, distances = self._codes, {}
+        for deleted in _deletes(code_string[:self.prefix_length], max_distance):
+            for word_id in self._index.get(deleted, ()):
+                if word_id in distances:
+                    continue
+                candidate = codes[word_id]
+                if abs(len(candidate) - len(code_string)) > max_distance:
+                    distances[word_id] = None
+                    continue
+                distance = Levenshtein.distance(code_string, candidate, score_cutoff=max_distance)
+                distances[word_id] = distance if distance <= max_distance else None
+
+        matches = sorted((LexiconMatch(self.words[word_id], distance, self.counts[word_id])
+                          for word_id, distance in distances.items() if distance is not None),
+                         key=lambda match: (match.distance, -match.count))
+        return matches[:limit]
+
+    def _trie_root(self):
+        # Nested {code: child} dicts over the code strings of all words, '' marks the end of a word.
+        # Only built for the first correction, lookups do not need it.
+        if self._trie is None:
+            root = {}
+            for word_id, code_string in enumerate(self._codes):
+                node = root
+                for code in code_string:
+                    node = node.setdefault(code, {})
+                node[''] = word_id
+            self._trie = root
+        return self._trie
+
+    def correct(self, aksharas, substitutions, beam_width=CORRECTION_BEAM_WIDTH, limit=LEXICON_LIMIT):
+        """
+        Finds the attested words a word may have been misread from, by substituting its aksharas.
+
+        Aksharas are substituted from left to right, and a partial correction is dropped as
+        soon as it is no prefix of an attested word. After each akshara only the beam_width
+        best scoring partial corrections are kept, so the work grows linearly with the
+        length of the word, however many aksharas could be substituted.
+
+        Args:
+            aksharas: The aksharas of the word.
+            substitutions: Callable returning the (replacement, probability) pairs for an
+                akshara. A replacement is a list of aksharas. Keeping an akshara scores 1.
+            beam_width: Number of partial corrections kept after each akshara.
+            limit: Number of candidates to return, None for all that were found.
+
+        Returns:
+            A list of CorrectionCandidate, best score first, then most attested first. The
+            word itself is a candidate (with a score of 1) if it is attested.
+        """
+        encode = self._vocabulary.encode_known
+        beam = [(1.0, self._trie_root(), ())]
+        for offset, akshara in enumerate(aksharas):
+            options = [((akshara,), 1.0, None)]
+            options.extend((tuple(replacement), probability, (offset, akshara, ''.join(replacement)))
+                           for replacement, probability in substitutions(akshara) if tuple(replacement) != (akshara,))
+
+            # Partial corrections that spell the same prefix are one state, keeping the best score
+            next_beam = {}
+            for replacement, probability, substitution in options:
+                codes = encode(replacement)
+                for score, node, applied in beam:
+                    for code in codes:
+                        node = node.get(code)
+                        if node is None:
+                            break
+                    else:
+                        score *= probability
+                        if id(node) not in next_beam or next_beam[id(node)][0] < score:
+                            next_beam[id(node)] = (score, node, applied + (substitution,) if substitution else applied)
+            beam = heapq.nlargest(beam_width, next_beam.values(), key=lambda state: state[0])
+            if not beam:
+                return []
+
+        candidates = [CorrectionCandidate(self.words[node['']], score, self.counts[node['']], applied)
+                      for score, node, applied in beam if '' in node]
+        candidates.sort(key=lambda candidate: (-candidate.score, -candidate.count))
+        return candidates[:limit]
@@ -0,0 +1,337 @@
+import argparse
+import codecs
+import functools
+import re
+import sys
+import time
+import unicodedata
+from array import array
+from itertools import accumulate
+
+# Constants
+VIRAMA = '್'
+ZWJ = '‍'
+ZWNJ = '‌'
+KANNADA_BLOCK = range(0x0C80, 0x0D00)
+CHUNK_SIZE = 1 << 16
+# Bump whenever the segmentation rules change, so that cached results keyed on it are not reused
+TOKENIZER_VERSION = 1
+
+# Character classes used by the segmenter, one letter per class so that a
+# whole line can be classified with a single str.translate call:
+#   M  combining mark (Mn, Mc, Me) other than the Kannada virama
+#   V  Kannada virama, joins the following letter into the same akshara
+#   L  other letter (Lo), the only thing a virama can join
+#   S  whitespace
+#   Z  zero width non-joiner, starts an akshara but is dropped from it
+#   B  anything else
+MARK, VIRAMA_CLASS, LETTER, SPACE, NON_JOINER, BASE = 'M', 'V', 'L', 'S', 'Z', 'B'
+
+def classify_char(char):
+    """Returns the segmenter class of a single character."""
+    if char == VIRAMA:
+        return VIRAMA_CLASS
+    if char == ZWNJ:
+        return NON_JOINER
+    category = unicodedata.category(char)
+    if category in ('Mn', 'Mc', 'Me'):
+        return MARK
+    if char.isspace():
+        return SPACE
+    if category == 'Lo':
+        return LETTER
+    return BASE
+
+class _CharClassTable(dict):
+    """str.translate table from code point to class letter, filled in on first sight outside the Kannada block."""
+
+    def __missing__(self, code_point):
+        char_class = self[code_point] = classify_char(chr(code_point))
+        return char_class
+
+CHAR_CLASS_TABLE = _CharClassTable((code_point, classify_char(chr(code_point))) for code_point in (*KANNADA_BLOCK, ord(ZWJ), ord(ZWNJ)))
+
+def classify_text(text):
+    """Returns a string of class letters, one per character of text."""
+    return text.translate(CHAR_CLASS_TABLE)
+
+def iter_akshara_spans(text, preserve_whitespace=False):
+    """
+    Yields the (start, end) offsets of each akshara in text.
+
+    A base character takes every following combining mark with it, and a
+    virama also takes the letter after it. text[start:end] is the token
+    tokenize_aksharas() returns, so a leading zero width non-joiner falls
+    just before start.
+    """
+    classes = text.translate(CHAR_CLASS_TABLE)
+    length = len(text)
+    index = 0
+    while index < length:
+        start = index
+        start_class = classes[index]
+        index += 1
+        if start_class == SPACE and not preserve_whitespace:
+            continue
+
+        while index < length:
+            char_class = classes[index]
+            if char_class == MARK:
+                index += 1
+            elif char_class == VIRAMA_CLASS:
+                index += 1
+                if index < length and classes[index] == LETTER:
+                    index += 1
+            else:
+                break
+
+        yield (start + 1 if start_class == NON_JOINER else start, index)
+
+def segment_aksharas(text, preserve_whitespace=False):
+    """Splits text into aksharas with the state machine of iter_akshara_spans()."""
+    return [text[start:end] for start, end in iter_akshara_spans(text, preserve_whitespace)]
+
+def akshara_boundaries(text):
+    """
+    Returns the offsets at which the aksharas of text start, followed by len(text).
+
+    Whitespace characters count as aksharas here (as with preserve_whitespace=True),
+    so the aksharas cover the whole text: akshara i is text[boundaries[i]:boundaries[i + 1]],
+    including any zero width non-joiner in front of it, and there are len(boundaries) - 1 of them.
+    """
+    boundaries = array('I', [0])
+    if ZWNJ in text:
+        # Every gap between spans is a non-joiner that belongs to the next akshara
+        boundaries.extend(end for _, end in iter_akshara_spans(text, preserve_whitespace=True))
+    else:
+        boundaries.extend(accumulate(map(len, tokenize_aksharas(text, preserve_whitespace=True))))
+    return boundaries
+
+# Inscription text repeats the same words over and over, so whole words are
+# segmented once and their aksharas reused. Whitespace always ends an akshara
+# when it is skipped, which makes the words independent of each other.
+WORD_CACHE_SIZE = 1 << 16
+_word_aksharas = {}
+_WHITESPACE_SPLIT = re.compile(r'(\s)').split
+
+def _segment_word(word):
+    if len(_word_aksharas) >= WORD_CACHE_SIZE:
+        _word_aksharas.clear()
+    aksharas = _word_aksharas[word] = tuple(segment_aksharas(word))
+    return aksharas
+
+def tokenize_aksharas(text, preserve_whitespace=False):
+    """
+    Splits text into aksharas, reusing the segmentation of words already seen.
+
+    Args:
+        text: The text to segment.
+        preserve_whitespace: If True, whitespace characters become tokens of their own.
+
+    Returns:
+        A list of akshara strings, identical to tokenize_kannada_reference().
+    """
+    tokens = []
+    extend = tokens.extend
+    cached = _word_aksharas.get
+
+    if not preserve_whitespace:
+        for word in text.split():
+            extend(cached(word) or _segment_word(word))
+        return tokens
+
+    # pieces alternate word, whitespace character, word, ... (words may be empty)
+    pieces = _WHITESPACE_SPLIT(text)
+    for word in pieces[2::2]:
+        if word and CHAR_CLASS_TABLE[ord(word[0])] in (MARK, VIRAMA_CLASS):
+            # A preserved whitespace character takes the marks that follow it
+            return segment_aksharas(text, preserve_whitespace=True)
+
+    append = tokens.append
+    for piece_index, piece in enumerate(pieces):
+        if piece_index % 2:
+            append(piece)
+        elif piece:
+            extend(cached(piece) or _segment_word(piece))
+    return tokens
+
+def _code_point_class(code_points):
+    # Collapse sorted code points into a regex character class of ranges
+    ranges = []
+    for code_point in code_points:
+        if ranges and ranges[-1][1] == code_point - 1:
+            ranges[-1][1] = code_point
+        else:
+            ranges.append([code_point, code_point])
+    return '[' + ''.join(re.escape(chr(first)) if first == last else f"{re.escape(chr(first))}-{re.escape(chr(last))}"
+                         for first, last in ranges) + ']'
+
+@functools.lru_cache(maxsize=None)
+def cluster_tail_pattern(astral):
+    """
+    Returns the regex for what follows the base character of an akshara: marks, and viramas with their letter.
+
+    Built on first use: scanning every code point for marks and letters takes a few tenths of a second.
+    Character classes reaching past U+FFFF are matched range by range instead of through a bitmap,
+    so the astral variant should only be used for text that actually has such characters.
+    """
+    limit = sys.maxunicode if astral else 0xFFFF
+    marks, letters = [], []
+    for code_point in range(limit + 1):
+        char_class = classify_char(chr(code_point))
+        if char_class == MARK:
+            marks.append(code_point)
+        elif char_class == LETTER:
+            letters.append(code_point)
+    return f"(?:{VIRAMA}{_code_point_class(letters)}?|{_code_point_class(marks)})"
+
+def has_astral_chars(text):
+    """True if text has characters beyond U+FFFF."""
+    return len(text.encode('utf-16-le', 'surrogatepass')) != 2 * len(text)
+
+@functools.lru_cache(maxsize=None)
+def _cluster_regex(preserve_whitespace, astral):
+    base = '.' if preserve_whitespace else r'\S'
+    return re.compile(f"{base}{cluster_tail_pattern(astral)}*", re.DOTALL)
+
+def regex_segment_aksharas(text, preserve_whitespace=False):
+    """
+    Splits text into aksharas with one precompiled cluster pattern matched by findall.
+
+    Returns:
+        A list of akshara strings, identical to tokenize_kannada_reference().
+    """
+    tokens = _cluster_regex(preserve_whitespace, has_astral_chars(text)).findall(text)
+    if ZWNJ in text:
+        tokens = [token[1:] if token[:1] == ZWNJ else token for token in tokens]
+    return tokens
+
+def tokenize_kannada_reference(text, preserve_whitespace=False):
+    """The original character by character segmenter, kept as the reference for parity checks."""
+    tokens = []
+    char_index = 0
+    while char_index < len(text):
+        char = text[char_index]
+        token = char
+        char_index += 1
+
+        if not preserve_whitespace and char.isspace():
+            continue
+
+        while char_index < len(text) and (
+            unicodedata.category(text[char_index]) in ('Mn', 'Mc', 'Me')
+            or (text[char_index] == '್' and char_index + 1 < len(text) and unicodedata.category(text[char_index + 1]) == 'Lo')
+        ):
+            token += text[char_index]
+            char_index += 1
+            if text[char_index - 1] == '್' and char_index < len(text) and unicodedata.category(text[char_index]) == 'Lo':
+                token += text[char_index]
+                char_index += 1
+
+        token = token.replace('‌', '')
+        tokens.append(token)
+
+    return tokens
+
+def last_akshara_start(text):
+    """
+    Returns the offset of the last akshara in text that more text could still extend.
+
+    Walks back over combining marks and virama-joined letters to the nearest
+    character that always starts an akshara or is whitespace, so text[:offset]
+    can be segmented on its own. text must itself start on an akshara boundary.
+    """
+    index = len(text) - 1
+    while index > 0:
+        char_class = CHAR_CLASS_TABLE[ord(text[index])]
+        if char_class not in (MARK, VIRAMA_CLASS) and not (char_class == LETTER and text[index - 1] == VIRAMA):
+            break
+        index -= 1
+    return max(index, 0)
+
+def iter_text_chunks(file_like, chunk_size):
+    """Reads file_like in chunks of chunk_size, decoding UTF-8 incrementally if it yields bytes."""
+    decoder = None
+    while True:
+        chunk = file_like.read(chunk_size)
+        if not chunk:
+            break
+        if isinstance(chunk, bytes):
+            decoder = decoder or codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    if decoder is not None:
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            yield tail
+
+def iter_aksharas(file_like, preserve_whitespace=False, chunk_size=CHUNK_SIZE):
+    """
+    Streams the aksharas of a text or binary file, reading chunk_size characters at a time.
+
+    The last akshara of every chunk is held back until the next chunk shows
+    whether marks or a virama-joined letter continue it, so the output is the
+    same as tokenize_aksharas(file_like.read()) while memory stays constant.
+    """
+    carry = ''
+    for chunk in iter_text_chunks(file_like, chunk_size):
+        text = carry + chunk
+        cut = last_akshara_start(text)
+        yield from tokenize_aksharas(text[:cut], preserve_whitespace)
+        carry = text[cut:]
+    if carry:
+        yield from tokenize_aksharas(carry, preserve_whitespace)
+
+# Segmenters selectable through tokenize_kannada(backend=...)
+TOKENIZER_BACKENDS = {
+    'table': tokenize_aksharas,
+    'regex': regex_segment_aksharas,
+    'reference': tokenize_kannada_reference,
+}
+
+def tokenize_with_backend(text, preserve_whitespace=False, backend='table'):
+    """Splits text into aksharas with the named segmenter from TOKENIZER_BACKENDS."""
+    try:
+        tokenizer = TOKENIZER_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown tokenizer backend {backend!r}, expected one of {', '.join(TOKENIZER_BACKENDS)}") from None
+    return tokenizer(text, preserve_whitespace)
+
+def find_parity_mismatches(texts, tokenizer, reference=tokenize_kannada_reference):
+    """Returns the texts (with both preserve_whitespace settings) on which tokenizer disagrees with reference."""
+    mismatches = []
+    for text in texts:
+        for preserve_whitespace in (False, True):
+            if tokenizer(text, preserve_whitespace) != reference(text, preserve_whitespace):
+                mismatches.append((text, preserve_whitespace))
+    return mismatches
+
+def main(argv=None):
+    from tools.workbookReader import DATA_FILE_URL, iter_workbook_rows
+
+    parser = argparse.ArgumentParser(description="Check the akshara segmenter against the reference on every corpus reading.")
+    parser.add_argument('--workbook', default=DATA_FILE_URL, help="URL or path of the inscription workbook")
+    args = parser.parse_args(argv)
+
+    readings = [reading for row in iter_workbook_rows(args.workbook, ['Expert_Reading', 'Our_Reading'])
+                for reading in row if isinstance(reading, str)]
+    tokenizers = {'table': segment_aksharas, 'cached': tokenize_aksharas, 'regex': regex_segment_aksharas}
+
+    failed = False
+    for name, tokenizer in tokenizers.items():
+        mismatches = find_parity_mismatches(readings, tokenizer)
+        failed = failed or bool(mismatches)
+        print(f"{name}: {len(readings)} readings checked, {len(mismatches)} mismatches")
+
+    corpus = '\n'.join(readings)
+    _cluster_regex(False, False)
+    for name, tokenizer in {'reference': tokenize_kannada_reference, **tokenizers}.items():
+        start = time.perf_counter()
+        tokenizer(corpus)
+        print(f"{name}: {len(corpus) / (time.perf_counter() - start) / 1e6:.1f} M chars/s")
+    return 1 if failed else 0
+
+# Entry point when the module is executed as a script
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,89 @@
+import threading
+
+# Private use code points handed out to aksharas, in order: the BMP block first,
+# then the supplementary planes 15 and 16 (their last two code points are noncharacters)
+PRIVATE_USE_RANGES = (range(0xE000, 0xF900), range(0xF0000, 0xFFFFE), range(0x100000, 0x10FFFE))
+VOCABULARY_CAPACITY = sum(map(len, PRIVATE_USE_RANGES))
+
+def _code_point(akshara_id):
+    for code_points in PRIVATE_USE_RANGES:
+        if akshara_id < len(code_points):
+            return code_points[akshara_id]
+        akshara_id -= len(code_points)
+    raise ValueError(f"The akshara vocabulary is full ({VOCABULARY_CAPACITY} aksharas)")
+
+class AksharaVocabulary:
+    """
+    Interns aksharas to stable integer ids, each with a private use character as its code.
+
+    A tokenized line encodes to a string with one code character per akshara, so
+    edit distances between lines run on plain strings, and every position in the
+    code string is the same position in the token list. Ids are handed out in
+    the order aksharas are first seen and never change, the vocabulary only grows.
+    """
+
+    def __init__(self, aksharas=()):
+        self._codes = {}
+        self._aksharas = []
+        self._lock = threading.Lock()
+        self.add(aksharas)
+
+    def __len__(self):
+        return len(self._aksharas)
+
+    def __contains__(self, akshara):
+        return akshara in self._codes
+
+    def add(self, aksharas):
+        """Interns every akshara not seen yet."""
+        codes = self._codes
+        for akshara in aksharas:
+            if akshara not in codes:
+                self._intern(akshara)
+
+    def _intern(self, akshara):
+        # Lookups never take the lock, only growing the vocabulary does
+        with self._lock:
+            code = self._codes.get(akshara)
+            if code is None:
+                code = chr(_code_point(len(self._aksharas)))
+                self._aksharas.append(akshara)
+                self._codes[akshara] = code
+            return code
+
+    def id(self, akshara):
+        """Returns the integer id of an akshara, interning it if needed."""
+        return self.code_id(self._codes.get(akshara) or self._intern(akshara))
+
+    def akshara(self, akshara_id):
+        """Returns the akshara with the given integer id."""
+        return self._aksharas[akshara_id]
+
+    def encode(self, tokens):
+        """Returns the code string of a list of aksharas, interning the ones not seen yet."""
+        codes = self._codes
+        try:
+            return ''.join(map(codes.__getitem__, tokens))
+        except KeyError:
+            return ''.join([codes.get(token) or self._intern(token) for token in tokens])
+
+    def encode_known(self, tokens, unknown_code='\x00'):
+        """Returns the code string of a list of aksharas without interning, unknown aksharas become unknown_code."""
+        codes = self._codes
+        return ''.join([codes.get(token, unknown_code) for token in tokens])
+
+    def decode(self, code_string):
+        """Returns the list of aksharas that a code string stands for."""
+        aksharas = self._aksharas
+        return [aksharas[self.code_id(code)] for code in code_string]
+
+    @staticmethod
+    def code_id(code):
+        """Returns the integer id a code character stands for."""
+        code_point = ord(code)
+        offset = 0
+        for code_points in PRIVATE_USE_RANGES:
+            if code_point in code_points:
+                return offset + code_point - code_points.start
+            offset += len(code_points)
+        raise ValueError(f"{code!r} is not an akshara code")
@@ -0,0 +1,260 @@
+import argparse
+import csv
+import glob
+import io
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from tools.kannadaTools import (DATA_FILE_URL, AksharaVocabulary, count_cleaned_aksharas, diff_inscriptions,
+                                iter_distinct_rows, iter_line_counts, iter_workbook_rows, prepare_reading, reading_distances)
+
+# Constants
+READING_COLUMNS = ('Expert_Reading', 'Our_Reading')
+DEFAULT_CHUNK_SIZE = 64
+TRANSCRIPTION_PATTERN = '*.txt'
+
+# Akshara counts of one reading (or one file). line_akshara_counts has an entry
+# for every line, blank lines included (with a count of 0), in line order.
+AksharaCount = namedtuple('AksharaCount', ['source', 'reading', 'line_akshara_counts', 'total_aksharas', 'num_lines'])
+
+def _count_lines(file_like):
+    line_akshara_counts = [akshara_count for _, akshara_count in iter_line_counts(file_like, blank_lines=True)]
+    return line_akshara_counts, sum(line_akshara_counts), len(line_akshara_counts)
+
+def _count_text(text):
+    return _count_lines(io.StringIO(text if isinstance(text, str) else ''))
+
+def _count_file(path):
+    with open(path, encoding='utf-8') as transcription_file:
+        return _count_lines(transcription_file)
+
+def _map_in_parallel(function, items, workers, chunk_size):
+    # Build the counting pattern before the pool starts, so that forked workers inherit it
+    count_cleaned_aksharas('')
+    if workers == 1:
+        return list(map(function, items))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(function, items, chunksize=chunk_size))
+
+def count_texts(texts, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Counts the aksharas of many texts on a process pool.
+
+    Args:
+        texts: The texts to count. Anything that is not a string counts as an empty text.
+        workers: Number of worker processes, defaults to the number of CPUs. 1 counts in this process.
+        chunk_size: Number of texts sent to a worker at a time.
+
+    Returns:
+        A list of (line_akshara_counts, total_aksharas, num_lines) tuples in the order of texts.
+    """
+    return _map_in_parallel(_count_text, list(texts), workers, chunk_size)
+
+def count_corpus_aksharas(workbook_source=DATA_FILE_URL, columns=READING_COLUMNS, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Counts the aksharas of every reading in the inscription workbook.
+
+    The workbook has one row per curated misread pair, so a line of an inscription is repeated
+    in consecutive rows once for every pair found on it. Those repeats are collapsed, and the
+    remaining rows of an inscription are counted as its lines, in workbook order, once per
+    reading column. A line without a reading counts as an empty line.
+
+    Returns:
+        A list of AksharaCount, one per inscription and reading column, in workbook order.
+    """
+    rows = list(iter_distinct_rows(iter_workbook_rows(workbook_source, ['Inscription_Name', *columns]), consecutive=True))
+    row_counts = count_texts([reading for row in rows for reading in row[1:]], workers, chunk_size)
+
+    inscriptions = {}
+    for index, row in enumerate(rows):
+        line_counts = inscriptions.setdefault(row[0], [[] for _ in columns])
+        for column_index in range(len(columns)):
+            line_counts[column_index].extend(row_counts[index * len(columns) + column_index][0] or [0])
+    return [AksharaCount(name, column, counts, sum(counts), len(counts))
+            for name, line_counts in inscriptions.items() for column, counts in zip(columns, line_counts)]
+
+def expand_transcription_paths(paths, pattern=TRANSCRIPTION_PATTERN):
+    """Replaces every folder in paths with the files in it that match pattern, sorted by name."""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded.extend(sorted(glob.glob(os.path.join(path, pattern))))
+        else:
+            expanded.append(path)
+    return expanded
+
+def count_files(paths, workers=None, chunk_size=1):
+    """
+    Counts the aksharas of transcription files on a process pool, streaming each file.
+
+    Returns:
+        A list of AksharaCount in the order of paths.
+    """
+    paths = list(paths)
+    counts = _map_in_parallel(_count_file, paths, workers, chunk_size)
+    return [AksharaCount(path, '', *count) for path, count in zip(paths, counts)]
+
+def write_counts_csv(akshara_counts, output):
+    """Writes one CSV row per reading, with the per-line counts separated by spaces in the last column."""
+    writer = csv.writer(output)
+    writer.writerow(['source', 'reading', 'num_lines', 'total_aksharas', 'line_akshara_counts'])
+    for count in akshara_counts:
+        writer.writerow([count.source, count.reading, count.num_lines, count.total_aksharas,
+                         ' '.join(map(str, count.line_akshara_counts))])
+
+def write_counts_json(akshara_counts, output):
+    """Writes the counts as a JSON list with one object per reading."""
+    json.dump([count._asdict() for count in akshara_counts], output, ensure_ascii=False, indent=1)
+    output.write('\n')
+
+# Pairwise comparison of several readings of one text. distances is the symmetric matrix of
+# akshara edit distances and rates[i][j] the distance as a fraction of the aksharas of reading i
+# (None if it has none). line_alignments and line_distances hold, for every pair (i, j) with
+# i < j, the aligned rows of lines and the distance of each row. edit_scripts has an
+# InscriptionDiff for each pair that was asked for.
+ReadingComparison = namedtuple('ReadingComparison', ['names', 'akshara_counts', 'distances', 'rates',
+                                                     'line_alignments', 'line_distances', 'edit_scripts'])
+
+# Readings of the current comparison, set once in every worker process
+_prepared_readings = None
+_reading_vocabulary = None
+_align_readings = True
+
+def _set_prepared_readings(prepared_readings, vocabulary, align):
+    global _prepared_readings, _reading_vocabulary, _align_readings
+    _prepared_readings, _reading_vocabulary, _align_readings = prepared_readings, vocabulary, align
+
+def _start_reading_worker(prepared_readings, aksharas, align):
+    # A vocabulary with the same aksharas in the same order hands out the same codes
+    _set_prepared_readings(prepared_readings, AksharaVocabulary(aksharas), align)
+
+def _compare_reading_pair(pair):
+    i, j = pair
+    return reading_distances(_prepared_readings[i], _prepared_readings[j], _reading_vocabulary, _align_readings)
+
+def compare_readings(readings, workers=None, align=True, edit_script_pairs=(), chunk_size=1):
+    """
+    Compares every pair of several readings of the same text on a process pool.
+
+    Each reading is cleaned, tokenized and encoded once, and only the line alignments
+    and edit distances are computed per pair, in the worker processes.
+
+    Args:
+        readings: A dict of named texts, or a list of texts (named by their index).
+        workers: Number of worker processes, defaults to the number of CPUs. 1 compares in this process.
+        align: If True, lines are aligned first, see diff_inscriptions().
+        edit_script_pairs: (i, j) pairs of reading indexes to compute a full InscriptionDiff for.
+        chunk_size: Number of pairs sent to a worker at a time.
+
+    Returns:
+        A ReadingComparison.
+    """
+    if isinstance(readings, dict):
+        names, texts = list(readings), list(readings.values())
+    else:
+        texts = list(readings)
+        names = [str(index) for index in range(len(texts))]
+    texts = [text if isinstance(text, str) else '' for text in texts]
+
+    # One vocabulary for this comparison only, the readings' codes must agree with each other and nothing else
+    vocabulary = AksharaVocabulary()
+    prepared_readings = [prepare_reading(text, vocabulary) for text in texts]
+    pairs = [(i, j) for i in range(len(texts)) for j in range(i + 1, len(texts))]
+    if workers == 1 or len(pairs) < 2:
+        _set_prepared_readings(prepared_readings, vocabulary, align)
+        try:
+            results = list(map(_compare_reading_pair, pairs))
+        finally:
+            _set_prepared_readings(None, None, True)
+    else:
+        aksharas = [vocabulary.akshara(akshara_id) for akshara_id in range(len(vocabulary))]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_start_reading_worker,
+                                 initargs=(prepared_readings, aksharas, align)) as executor:
+            results = list(executor.map(_compare_reading_pair, pairs, chunksize=chunk_size))
+
+    akshara_counts = [reading.total_aksharas for reading in prepared_readings]
+    distances = [[0] * len(texts) for _ in texts]
+    line_alignments, line_distances = {}, {}
+    for (i, j), (line_alignment, pair_line_distances) in zip(pairs, results):
+        distances[i][j] = distances[j][i] = sum(pair_line_distances)
+        line_alignments[i, j] = line_alignment
+        line_distances[i, j] = pair_line_distances
+    rates = [[distance / akshara_counts[i] if akshara_counts[i] else None for distance in row]
+             for i, row in enumerate(distances)]
+    edit_scripts = {(i, j): diff_inscriptions(texts[i], texts[j], align) for i, j in edit_script_pairs}
+    return ReadingComparison(names, akshara_counts, distances, rates, line_alignments, line_distances, edit_scripts)
+
+def write_distance_matrix_csv(reading_comparison, output):
+    """Writes the distance matrix as CSV, with the reading names as the first row and column."""
+    writer = csv.writer(output)
+    writer.writerow(['reading', 'total_aksharas', *reading_comparison.names])
+    for name, akshara_count, row in zip(reading_comparison.names, reading_comparison.akshara_counts, reading_comparison.distances):
+        writer.writerow([name, akshara_count, *row])
+
+def write_distance_matrix_json(reading_comparison, output):
+    """Writes the reading names, akshara counts, distances and rates as a JSON object."""
+    json.dump({field: getattr(reading_comparison, field) for field in ('names', 'akshara_counts', 'distances', 'rates')},
+              output, ensure_ascii=False, indent=1)
+    output.write('\n')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count aksharas per line for every corpus reading or for transcription files, or compare transcriptions.")
+    parser.add_argument('paths', nargs='*', help="transcription files or folders, - for stdin (default: the workbook readings)")
+    parser.add_argument('--workbook', default=DATA_FILE_URL, help="URL or path of the inscription workbook")
+    parser.add_argument('--columns', nargs='+', default=list(READING_COLUMNS), help="workbook columns to count")
+    parser.add_argument('--pattern', default=TRANSCRIPTION_PATTERN, help="files to count inside a folder")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--chunk-size', type=int, default=None, help="readings or files sent to a worker at a time")
+    parser.add_argument('--format', choices=('csv', 'json'), default='csv')
+    parser.add_argument('--output', help="file to write (default: stdout)")
+    parser.add_argument('--compare', action='store_true', help="write the akshara distance matrix of the given files instead")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return _compare_main(args)
+
+    start = time.perf_counter()
+    if not args.paths:
+        akshara_counts = count_corpus_aksharas(args.workbook, args.columns, args.workers, args.chunk_size or DEFAULT_CHUNK_SIZE)
+    else:
+        paths = expand_transcription_paths([path for path in args.paths if path != '-'], args.pattern)
+        akshara_counts = count_files(paths, args.workers, args.chunk_size or 1)
+        if '-' in args.paths:
+            akshara_counts.append(AksharaCount('-', '', *_count_lines(sys.stdin)))
+    elapsed = time.perf_counter() - start
+
+    write = write_counts_json if args.format == 'json' else write_counts_csv
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as output:
+            write(akshara_counts, output)
+    else:
+        write(akshara_counts, sys.stdout)
+    print(f"Counted {sum(count.total_aksharas for count in akshara_counts)} aksharas in "
+          f"{len(akshara_counts)} readings in {elapsed:.2f}s", file=sys.stderr)
+
+def _compare_main(args):
+    paths = expand_transcription_paths(args.paths, args.pattern)
+    readings = {}
+    for path in paths:
+        with open(path, encoding='utf-8') as transcription_file:
+            readings[path] = transcription_file.read()
+
+    start = time.perf_counter()
+    reading_comparison = compare_readings(readings, args.workers, chunk_size=args.chunk_size or 1)
+    elapsed = time.perf_counter() - start
+
+    write = write_distance_matrix_json if args.format == 'json' else write_distance_matrix_csv
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as output:
+            write(reading_comparison, output)
+    else:
+        write(reading_comparison, sys.stdout)
+    print(f"Compared {len(reading_comparison.line_distances)} pairs of {len(paths)} readings in {elapsed:.2f}s", file=sys.stderr)
+
+# Entry point when the module is executed as a script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import json
+import os
+
+# Results derived from the workbook, cached as JSON next to it. Each file records the corpus version
+# (content hash of the workbook) it was built from and a format version, bumped by its owner whenever
+# a change would give different results.
+
+def save_corpus_json(path, corpus_version, format_version, content, indent=None):
+    """Writes content (a dict) to path as JSON for one corpus version, replacing any previous file atomically."""
+    content = {**content, 'corpus_version': corpus_version, 'format_version': format_version}
+
+    temporary_path = f"{path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as cache_file:
+        json.dump(content, cache_file, ensure_ascii=False, indent=indent)
+    os.replace(temporary_path, path)
+
+def read_corpus_json(path, format_version, parse=dict):
+    """
+    Reads a file written by save_corpus_json() with the given format version.
+
+    Args:
+        path: Location of the file.
+        format_version: Format version the file must have been written with.
+        parse: Turns the content dict into the cached result. A KeyError, TypeError or
+            AttributeError it raises means the file is not valid.
+
+    Returns:
+        A tuple containing the corpus version of the file and the parsed content.
+
+    Raises:
+        ValueError: If the file is not valid or was written with another format version.
+    """
+    with open(path, encoding='utf-8') as cache_file:
+        try:
+            content = json.load(cache_file)
+            if content.get('format_version') != format_version:
+                raise ValueError(f"{path} was written by another version of the code")
+            return content['corpus_version'], parse(content)
+        except (AttributeError, KeyError, TypeError, json.JSONDecodeError) as e:
+            raise ValueError(f"{path} is not a valid cache file: {e}")
+
+def load_corpus_json(path, corpus_version, format_version, build, dump=dict, parse=dict, indent=None):
+    """
+    Returns the result cached at path for a corpus version, building and caching it only when
+    the file is missing, invalid or from another corpus or format version.
+
+    Args:
+        path: Location of the cache file.
+        corpus_version: get_corpus_version() of the current workbook.
+        format_version: Format version of the cached result.
+        build: Builds the result from the workbook, called without arguments.
+        dump: Turns the result into a dict for JSON.
+        parse: Turns the dict read back into the result.
+        indent: JSON indentation of the file.
+    """
+    try:
+        cached_version, result = read_corpus_json(path, format_version, parse)
+        if cached_version == corpus_version:
+            return result
+    except (OSError, ValueError):
+        pass
+
+    result = build()
+    try:
+        save_corpus_json(path, corpus_version, format_version, dump(result), indent)
+    except OSError:
+        # A read-only deployment still works, it just builds the result again on every run
+        pass
+    return result
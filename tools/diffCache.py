@@ -0,0 +1,62 @@
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+# Constants
+LINE_DIFF_CACHE_SIZE = 1 << 14
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'size', 'maxsize'])
+
+def content_key(*parts):
+    """Returns a 16 byte digest identifying the given strings, in order."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        encoded = str(part).encode('utf-8', 'surrogatepass')
+        digest.update(len(encoded).to_bytes(8, 'little'))
+        digest.update(encoded)
+    return digest.digest()
+
+class LineDiffCache:
+    """
+    Bounded least recently used cache of line comparisons, keyed by content_key().
+
+    Entries must not be changed once stored, they are shared by everyone who
+    looks them up. Safe to use from several threads.
+    """
+
+    def __init__(self, maxsize=LINE_DIFF_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute):
+        """Returns the entry stored under key, storing compute() there first if there is none."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Computed outside the lock, two threads may both compute a missing entry
+        entry = compute()
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        """Drops every entry and resets the statistics."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        """Returns the hit and miss counts and the current and maximum number of entries."""
+        with self._lock:
+            return CacheStats(self.hits, self.misses, len(self._entries), self.maxsize)
@@ -1,12 +1,31 @@
 import pandas as pd
 import re
-import unicodedata
 import Levenshtein
+import functools
+import html
+import json
+import os
+from array import array
+from collections import namedtuple
+
+from tools.aksharaTokenizer import CHAR_CLASS_TABLE, CHUNK_SIZE, LETTER, TOKENIZER_BACKENDS, TOKENIZER_VERSION, VIRAMA, ZWNJ, akshara_boundaries, cluster_tail_pattern, has_astral_chars, iter_akshara_spans, iter_aksharas, iter_text_chunks, last_akshara_start, tokenize_aksharas, tokenize_with_backend
+from tools.workbookReader import DATA_FILE_URL, INSCRIPTION_COLUMNS, iter_distinct_rows, iter_workbook_rows, read_workbook_bytes, get_corpus_version
+from tools.aksharaVocabulary import AksharaVocabulary
+from tools.sequenceAlignment import align_lines, bounded_edit_distance
+from tools.diffCache import LineDiffCache, content_key
+from tools.corpusCache import load_corpus_json
+from tools.aksharaLexicon import CORRECTION_BEAM_WIDTH, LEXICON_LIMIT, LEXICON_MAX_DISTANCE, AksharaLexicon, CorrectionCandidate, LexiconMatch
+from tools.misreadAutomaton import AksharaAutomaton, AutomatonMatch
+from tools.misreadIndex import ConfusionMatrix, MisreadIndex, ScoredCorrection, build_misread_dict, count_misread_pairs, load_misread_index
 
 # Constants 
-DATA_FILE_URL = "https://github.com/mythicsociety/KannadaTools/raw/94814a2766fd22e89e24976eded769d45a82560a/mythic_society%20(1).xlsx"
 KANNADA_CHAR_RANGE = r'[\u0C80-\u0CFF]'
 SPECIAL_CHARS_REGEX = r'[^\w\s\u0C80-\u0CFF\u200c|]'
+LINE_BREAK_REGEX = r'\r\n|[\n\r\v\f\x1c\x1d\x1e\x85\u2028\u2029]'
+WORD_SEPARATOR_REGEX = r'[\s|]+'
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mythic_society.lexicon.json')
+# Bumped whenever a change to how expert words are split or counted would give different word counts
+LEXICON_FORMAT_VERSION = 2
 
 # Global variables 
 df = None 
@@ -15,101 +34,308 @@ misread_dict = None
 def initialize_globals(): 
     global df 
     global misread_dict 
+    workbook_bytes = read_workbook_bytes()
+
     # Load the DataFrame 
-    df = load_inscription_data() 
+    df = load_inscription_data(workbook_bytes) 
     
-    # Create misread dictionary
-    misread_dict = get_misread_dict(df)
+    # Load misread dictionary from the compiled index
+    misread_dict = load_misread_index(workbook_bytes=workbook_bytes).misread_dict
 
-def load_inscription_data():
-    """Loads inscription data from the Excel file."""
-    return pd.read_excel(DATA_FILE_URL)
+def load_inscription_data(source=DATA_FILE_URL, columns=INSCRIPTION_COLUMNS):
+    """Loads inscription data from the Excel file (URL, local path or raw bytes), keeping only the given columns."""
+    columns = list(columns)
+    return pd.DataFrame.from_records(iter_workbook_rows(source, columns), columns=columns)
 
 # Create misread dictionary (with caching) 
 def get_misread_dict(dataframe):
-    """Creates a dictionary of misread aksharas and their corrections."""
-    misread_dict = {}
-    for _, row in dataframe.iterrows():
-        misread_akshara = row['different_aksharas_in_sentence1']
-        corrected_akshara = row['different_aksharas_in_sentence2']
-
-        if pd.notna(misread_akshara) and pd.notna(corrected_akshara):
-            if misread_akshara not in misread_dict:
-                misread_dict[misread_akshara] = [corrected_akshara]
-            else:
-                if corrected_akshara not in misread_dict[misread_akshara]:
-                    misread_dict[misread_akshara].append(corrected_akshara)
-
-    return misread_dict
+    """Creates a read-only dictionary of misread aksharas and their corrections, most frequent correction first."""
+    return build_misread_dict(count_misread_pairs(dataframe))
 
 # Tokenize Kannada text 
-def tokenize_kannada(text, preserve_whitespace=False):
-    """Splits Kannada text into tokens, optionally preserving whitespace."""
-    tokens = []
-    char_index = 0
-    while char_index < len(text):
-        char = text[char_index]
-        token = char
-        char_index += 1
-
-        if not preserve_whitespace and char.isspace():
-            continue
-
-        while char_index < len(text) and (
-            unicodedata.category(text[char_index]) in ('Mn', 'Mc', 'Me')
-            or (text[char_index] == '್' and char_index + 1 < len(text) and unicodedata.category(text[char_index + 1]) == 'Lo')
-        ):
-            token += text[char_index]
-            char_index += 1
-            if text[char_index - 1] == '್' and char_index < len(text) and unicodedata.category(text[char_index]) == 'Lo':
-                token += text[char_index]
-                char_index += 1
-
-        token = token.replace('\u200c', '')
-        tokens.append(token)
-
-    return tokens
+def tokenize_kannada(text, preserve_whitespace=False, backend='table'):
+    """Splits Kannada text into tokens, optionally preserving whitespace. backend is one of TOKENIZER_BACKENDS."""
+    return tokenize_with_backend(text, preserve_whitespace, backend)
 
 
 # Predict potential misreads 
-def predict_misreads(sentence, misread_dict):
-    """Predicts potential misread aksharas in a sentence."""
+def predict_misreads(sentence, misread_dict, top_k=None, misread_automaton=None):
+    """
+    Predicts potential misread aksharas in a sentence.
+
+    misread_dict may be a ConfusionMatrix, whose corrections are ranked ScoredCorrection
+    tuples. top_k keeps only the most frequent corrections of each akshara. Without
+    misread_automaton (see MisreadIndex.misread_automaton) only misreads of a single
+    akshara are found.
+    """
     potential_misreads = {}
     tokens = tokenize_kannada(sentence)  
 
+    if misread_automaton is not None:
+        for match in misread_automaton.iter_matches(tokens):
+            potential_misreads[match.pattern] = misread_dict[match.pattern][:top_k]
+        return potential_misreads
+
     for token in tokens:
         if token in misread_dict:
-            potential_misreads[token] = misread_dict[token]
+            potential_misreads[token] = misread_dict[token][:top_k]
 
     return potential_misreads
 
+# Words of a reading
+def split_reading_words(text):
+    """Cleans a reading and splits it into words at whitespace and pipe symbols."""
+    return [word for word in _WORD_SEPARATOR.split(clean_inscription_text(text)) if word]
+
+_WORD_SEPARATOR = re.compile(WORD_SEPARATOR_REGEX)
+
+def count_expert_words(source=DATA_FILE_URL):
+    """
+    Counts the lines of Expert_Reading every word is attested on, in the workbook (URL, local path
+    or raw bytes), in order of first appearance.
+
+    The workbook repeats a line once for every curated misread pair on it, so each distinct
+    (Inscription_Name, Expert_Reading) line is only counted once.
+    """
+    word_counts = {}
+    for _, expert_reading in iter_distinct_rows(iter_workbook_rows(source, ['Inscription_Name', 'Expert_Reading'])):
+        if isinstance(expert_reading, str):
+            for word in split_reading_words(expert_reading):
+                word_counts[word] = word_counts.get(word, 0) + 1
+    return word_counts
+
+def build_expert_lexicon(source=DATA_FILE_URL, max_distance=LEXICON_MAX_DISTANCE):
+    """Builds an AksharaLexicon of every word attested in Expert_Reading, from the workbook (URL, local path or raw bytes)."""
+    return AksharaLexicon(count_expert_words(source), max_distance)
+
+def load_expert_lexicon(workbook_source=DATA_FILE_URL, lexicon_path=DEFAULT_LEXICON_PATH, workbook_bytes=None,
+                        max_distance=LEXICON_MAX_DISTANCE):
+    """
+    Loads the lexicon of expert words, reading the workbook again only when its content changed.
+
+    Args:
+        workbook_source: URL or path of the inscription workbook.
+        lexicon_path: Location of the cached expert word counts.
+        workbook_bytes: Already downloaded workbook content, used instead of workbook_source.
+        max_distance: Largest distance the lexicon is looked up at.
+
+    Returns:
+        An AksharaLexicon matching the current workbook.
+    """
+    if workbook_bytes is None:
+        workbook_bytes = read_workbook_bytes(workbook_source)
+    word_counts = load_corpus_json(lexicon_path, get_corpus_version(workbook_bytes), f"{LEXICON_FORMAT_VERSION}/{TOKENIZER_VERSION}",
+                                   lambda: count_expert_words(workbook_bytes),
+                                   lambda word_counts: {'word_counts': word_counts}, lambda content: dict(content['word_counts']))
+    return AksharaLexicon(word_counts, max_distance)
+
+def suggest_expert_words(sentence, expert_lexicon, max_distance=None, limit=LEXICON_LIMIT):
+    """
+    Looks up the closest attested expert words for every word of a sentence.
+
+    Returns:
+        A {word: [LexiconMatch, ...]} dict in sentence order, closest match first. A word
+        that is attested as it is has itself as first match, at distance 0.
+    """
+    return {word: expert_lexicon.lookup(word, max_distance, limit) for word in split_reading_words(sentence)}
+
+def suggest_corrections(word, reverse_confusion_matrix, expert_lexicon, top_k=LEXICON_LIMIT, beam_width=CORRECTION_BEAM_WIDTH):
+    """
+    Suggests the attested expert words a word of a reading may have been misread from.
+
+    Every akshara of the word may be replaced by an akshara it was seen as a misreading of,
+    scored by how often that happened, and only replacements that keep the word a prefix
+    of an attested expert word are followed, see AksharaLexicon.correct().
+
+    Args:
+        word: A word of a reading, e.g. from Our_Reading.
+        reverse_confusion_matrix: MisreadIndex.reverse_confusion_matrix, from each akshara
+            of a reading to the expert aksharas it was seen for.
+        expert_lexicon: The AksharaLexicon from build_expert_lexicon().
+        top_k: Number of candidates to return.
+        beam_width: Number of partial corrections kept after each akshara.
+
+    Returns:
+        A list of CorrectionCandidate, most likely first.
+    """
+    def substitutions(akshara):
+        return [(tokenize_aksharas(candidate.correction), candidate.probability)
+                for candidate in reverse_confusion_matrix.top_corrections(akshara)
+                if isinstance(candidate.correction, str)]
+
+    return expert_lexicon.correct(tokenize_kannada(word), substitutions, beam_width, top_k)
+
+# One misread found in a sentence: its aksharas are tokens[start:end] of tokenize_kannada(sentence),
+# and sentence[char_start:char_end] in the text
+MisreadMatch = namedtuple('MisreadMatch', ['start', 'end', 'char_start', 'char_end', 'misread', 'corrections'])
+
+def find_misreads(sentence, misread_dict, misread_automaton, top_k=None):
+    """Returns a MisreadMatch for every occurrence of a misread key in a sentence, in order of where it ends."""
+    spans = tokenize_kannada_spans(sentence)
+    return [MisreadMatch(match.start, match.end, spans[match.start][0], spans[match.end - 1][1],
+                         match.pattern, misread_dict[match.pattern][:top_k])
+            for match in misread_automaton.iter_matches(tokenize_kannada(sentence))]
+
+# One misread found while scanning: the line it is on (from 1), the akshara offset where it starts
+# (an index into tokenize_kannada(line)), the misread key and its corrections
+MisreadOccurrence = namedtuple('MisreadOccurrence', ['line', 'offset', 'misread', 'corrections'])
+
+def scan_misreads(lines, misread_dict, misread_automaton=None, top_k=None, first_line=1):
+    """
+    Finds every occurrence of a misread in a file or any iterable of lines, lazily.
+
+    Lines are read and scanned one at a time, so the input is never held in memory
+    as a whole and every occurrence is yielded as soon as its line has been scanned.
+
+    Args:
+        lines: A text file object or an iterable of lines.
+        misread_dict: The misread dictionary, or a ConfusionMatrix for scored corrections.
+        misread_automaton: AksharaAutomaton of the misread keys, needed to find keys of several aksharas.
+        top_k: Number of corrections to keep per misread, default all.
+        first_line: Line number of the first line, for text scanned a batch of lines at a time.
+
+    Yields:
+        A MisreadOccurrence for every misread, in line order and within a line by where it ends.
+    """
+    for line_number, line in enumerate(lines, first_line):
+        tokens = tokenize_kannada(line)
+        if misread_automaton is not None:
+            for match in misread_automaton.iter_matches(tokens):
+                yield MisreadOccurrence(line_number, match.start, match.pattern, misread_dict[match.pattern][:top_k])
+            continue
+        for offset, token in enumerate(tokens):
+            if token in misread_dict:
+                yield MisreadOccurrence(line_number, offset, token, misread_dict[token][:top_k])
+
+def misread_occurrence_to_dict(occurrence):
+    """Returns a MisreadOccurrence as a dict ready for JSON, with scored corrections as dicts too."""
+    content = occurrence._asdict()
+    content['corrections'] = [correction._asdict() if isinstance(correction, ScoredCorrection) else correction
+                              for correction in occurrence.corrections]
+    return content
+
+def iter_misread_json_lines(occurrences, **fields):
+    """
+    Yields every MisreadOccurrence as one line of JSON (NDJSON), like misread_occurrence_to_dict(),
+    with any extra fields given added to each line.
+
+    A misread comes up over and over in a long text, so its corrections are only turned into
+    JSON the first time.
+    """
+    extra_json = ''.join(f', {json.dumps(name)}: {json.dumps(value, ensure_ascii=False)}' for name, value in fields.items())
+    misread_json = {}
+    for occurrence in occurrences:
+        key = (occurrence.misread, len(occurrence.corrections))
+        fragment = misread_json.get(key)
+        if fragment is None:
+            content = misread_occurrence_to_dict(occurrence)
+            fragment = misread_json[key] = (f'"misread": {json.dumps(content["misread"], ensure_ascii=False)}, '
+                                            f'"corrections": {json.dumps(content["corrections"], ensure_ascii=False)}')
+        yield f'{{"line": {occurrence.line}, "offset": {occurrence.offset}, {fragment}{extra_json}}}\n'
+
 # Clean text 
 def clean_inscription_text(text):
     """Cleans inscription text by removing special characters and extra whitespace."""
-    text = re.sub(r'\[.*?\]', '', text)
-    text = re.sub(r'\(.*?\)', '', text)
-    text = ' '.join(text.split())
-    text = re.sub(SPECIAL_CHARS_REGEX, '', text)
-    return text
+    if '[' in text or '(' in text:
+        text = _BRACKETED_REGEX.sub('', text)
+    return _SPECIAL_CHARS.sub('', ' '.join(text.split()))
+
+def clean_inscription_text_with_offsets(text):
+    """
+    Cleans inscription text like clean_inscription_text() and maps the result back onto the input.
+
+    Returns:
+        A tuple containing:
+        - cleaned_text: the cleaned text.
+        - offsets: an array with the position in text of every character of cleaned_text,
+          followed by len(text). A space that replaces a run of whitespace points at the
+          start of the run.
+    """
+    offsets = array('I')
+    cleaned_text = _clean_tracking_offsets(text, offsets)
+    offsets.append(len(text))
+    return cleaned_text, offsets
+
+# Bracketed text, matched in one pass with the same result as removing [...] and then (...):
+# a parenthesis may span bracketed text, whose ')' does not count
+_SQUARE_GROUP = r'\[[^\]\n]*\]'
+_ROUND_GROUP = rf'\((?:{_SQUARE_GROUP}|\[(?![^\]\n]*\])|[^)\n\[])*?\)'
+_BRACKETED_REGEX = re.compile(f'{_SQUARE_GROUP}|{_ROUND_GROUP}')
+_SPECIAL_CHARS = re.compile(SPECIAL_CHARS_REGEX)
+
+# Everything the cleaner drops or rewrites, matched in one pass so that every output
+# character can be traced back to the input
+_CLEANING_REGEX = re.compile(
+    rf'(?P<group>{_SQUARE_GROUP}|{_ROUND_GROUP})'
+    rf'|(?P<space>\s(?:\s|{_SQUARE_GROUP}|{_ROUND_GROUP})*)'
+    r'|(?P<special>[^\w\s\u0C80-\u0CFF\u200c|\[(]+|[\[(])'
+)
+
+def _clean_tracking_offsets(text, offsets):
+    # Appends the input position of every output character to offsets
+    parts = []
+    position = 0
+    # Whitespace at either end of what is left after removing brackets is dropped, not turned into a space
+    has_text = False
+    for match in _CLEANING_REGEX.finditer(text):
+        start, end = match.span()
+        if position < start:
+            parts.append(text[position:start])
+            offsets.extend(range(position, start))
+            has_text = True
+        position = end
+
+        kind = match.lastgroup
+        if kind == 'special':
+            has_text = True
+        elif kind == 'space' and has_text and end < len(text):
+            parts.append(' ')
+            offsets.append(start)
+
+    if position < len(text):
+        parts.append(text[position:])
+        offsets.extend(range(position, len(text)))
+    return ''.join(parts)
 
 # Count aksharas 
 def count_aksharas(text):
     """Counts the number of aksharas in Kannada text."""
-    text = clean_inscription_text(text)
-    words = re.split(r'(\s+|\|)', text)
-    tokens = []
-    for word in words:
-        if word.strip() and word != '|':
-            tokens.extend(tokenize_kannada(word))  
-        elif word == '|':
-            tokens.append(word)
-    tokens = [token for token in tokens if token.strip()]
-    return len(tokens)
+    return count_cleaned_aksharas(clean_inscription_text(text))
+
+@functools.lru_cache(maxsize=None)
+def _akshara_count_regex(astral):
+    # One match per counted token: a base character with its marks, or a pipe symbol. A non-joiner
+    # without marks after it leaves an empty token, which is not counted.
+    cluster_tail = cluster_tail_pattern(astral)
+    return re.compile(rf'[^\s|{ZWNJ}]{cluster_tail}*|\||{ZWNJ}{cluster_tail}+')
+
+def count_cleaned_aksharas(cleaned_text):
+    """
+    Counts the aksharas of already cleaned text in one regex pass, without building token lists.
+
+    Whitespace and the pipe symbol '|' separate words, and each pipe symbol counts as one akshara.
+    """
+    return _akshara_count_regex(has_astral_chars(cleaned_text)).subn('', cleaned_text)[1]
 
 # Get Levenshtein differences 
 def get_levenshtein_diffs(seq1, seq2):
     """Compares two sequences and returns Levenshtein differences."""
-    edit_ops = Levenshtein.editops(seq1, seq2)
+    return _edit_differences(akshara_editops(seq1, seq2), seq1, seq2)
+
+def akshara_editops(seq1, seq2, vocabulary=None):
+    """
+    Levenshtein.editops() for two akshara lists, or for their code strings if a vocabulary is given.
+
+    python-Levenshtein hashes list elements in C, so token lists are compared as they are;
+    interning them first only pays off for readings encoded once and compared many times,
+    see prepare_reading(). The edit script of long sequences (an inscription typed as one
+    line) is recovered with Hirschberg's divide and conquer, in linear memory.
+    """
+    if vocabulary is not None:
+        seq1, seq2 = vocabulary.encode(seq1), vocabulary.encode(seq2)
+    return Levenshtein.editops(seq1, seq2)
+
+def _edit_differences(edit_ops, seq1, seq2):
     differences = []
     for op, i1, i2 in edit_ops:
         if op == 'replace':
@@ -120,75 +346,335 @@ def get_levenshtein_diffs(seq1, seq2):
             differences.append(('', seq2[i2]))
     return differences
 
-# Compare lines with highlighting 
-def compare_and_highlight_lines(text1, text2, color1, color2):
+def _akshara_width(token):
+    # Number of aksharas in a token from a preserve_whitespace=True split once it is split again on its own.
+    # Its leading whitespace is dropped, and a virama that lost its base (to whitespace or a non-joiner)
+    # no longer holds on to the letter after it.
+    if token[:1].isspace():
+        token = token[1:]
+    if not token:
+        return 0
+    return 2 if token[0] == VIRAMA and len(token) > 1 and CHAR_CLASS_TABLE[ord(token[1])] == LETTER else 1
+
+# Diff of one pair of lines. edit_ops are the Levenshtein (op, i1, i2) triples over the akshara
+# tokens of the cleaned lines, differences the (akshara1, akshara2) pairs they change, with ''
+# for a missing akshara. A line without differences is the same in both inscriptions.
+LineDiff = namedtuple('LineDiff', ['line1', 'line2', 'cleaned_line1', 'cleaned_line2', 'tokens1', 'tokens2',
+                                   'edit_ops', 'differences', 'line_differences'])
+# line_alignment has the (op, i1, i2, j1, j2) row of align_lines() that each LineDiff compares
+InscriptionDiff = namedtuple('InscriptionDiff', ['line_diffs', 'total_differences', 'line_alignment'])
+
+def diff_lines(line1, line2):
+    """Cleans, tokenizes and aligns one pair of lines, returning a LineDiff."""
+    return _diff_cleaned_lines(line1, line2, clean_inscription_text(line1), clean_inscription_text(line2))
+
+# Line comparisons only depend on the cleaned lines, so an edited inscription is compared
+# again without redoing the lines that did not change
+line_diff_cache = LineDiffCache()
+
+def _diff_cleaned_lines(line1, line2, cleaned_line1, cleaned_line2):
+    return LineDiff(line1, line2, cleaned_line1, cleaned_line2, *_compare_cached_lines(cleaned_line1, cleaned_line2))
+
+def _compare_cached_lines(cleaned_line1, cleaned_line2):
+    key = content_key(TOKENIZER_VERSION, cleaned_line1, cleaned_line2)
+    return line_diff_cache.get_or_compute(key, lambda: _compare_cleaned_lines(cleaned_line1, cleaned_line2))
+
+def _compare_cleaned_lines(cleaned_line1, cleaned_line2):
+    # Tuples all the way down, cached comparisons are shared
+    tokens1 = tuple(tokenize_kannada(cleaned_line1, preserve_whitespace=True))
+    tokens2 = tuple(tokenize_kannada(cleaned_line2, preserve_whitespace=True))
+
+    edit_ops = tuple(akshara_editops(tokens1, tokens2))
+    differences = tuple(diff for diff in _edit_differences(edit_ops, tokens1, tokens2) if diff != ('', ''))
+    line_differences = 0
+    for op, i1, _ in edit_ops if differences else ():
+        # A replaced akshara counts as many aksharas as it has once split on its own
+        line_differences += _akshara_width(tokens1[i1]) if op == 'replace' else 1
+    return tokens1, tokens2, edit_ops, differences, line_differences
+
+def diff_inscriptions(text1, text2, align=True):
     """
-    Compares two Kannada texts line by line, highlighting differences.
+    Compares two Kannada texts line by line.
+
+    Args:
+        text1: The first text (usually the expert reading).
+        text2: The second text.
+        align: If True, lines are first aligned with align_lines(), so that a missing,
+            extra, split or merged line only affects itself. If False, line i of one
+            text is compared with line i of the other.
+
+    Returns:
+        An InscriptionDiff with one LineDiff per aligned pair of lines (a side with no
+        line compares as an empty line, split or merged lines as one line) and the total
+        number of differing aksharas. Nothing is rendered, see render_highlighted_line(),
+        render_differences(), inscription_diff_to_dict() and render_inscription_diff_text().
+    """
+    lines1 = text1.splitlines()
+    lines2 = text2.splitlines()
+    cleaned_lines1 = [clean_inscription_text(line) for line in lines1]
+    cleaned_lines2 = [clean_inscription_text(line) for line in lines2]
+    if align:
+        line_alignment = align_lines(cleaned_lines1, cleaned_lines2)
+    else:
+        line_alignment = _pair_lines_by_index(len(lines1), len(lines2))
+
+    line_diffs = [_diff_cleaned_lines('\n'.join(lines1[i1:i2]), '\n'.join(lines2[j1:j2]),
+                                      _aligned_cleaned_line(lines1, cleaned_lines1, i1, i2),
+                                      _aligned_cleaned_line(lines2, cleaned_lines2, j1, j2))
+                  for _, i1, i2, j1, j2 in line_alignment]
+    return InscriptionDiff(line_diffs, sum(line_diff.line_differences for line_diff in line_diffs), line_alignment)
+
+def _aligned_cleaned_line(lines, cleaned_lines, start, end):
+    # A missing line compares as an empty one, split or merged lines as one line
+    if end - start == 1:
+        return cleaned_lines[start]
+    return clean_inscription_text('\n'.join(lines[start:end]))
+
+def inscription_distance(text1, text2, max_distance=None, max_rate=None, align=True):
+    """
+    Akshara edit distance between two Kannada texts, for triage against a threshold.
+
+    The distance is counted the same way as diff_inscriptions().total_differences, the
+    number behind the reported difference rate: an akshara replaced by a space counts as
+    one difference, a space replaced by an akshara as none, and a replaced akshara that
+    starts with a virama as two. With a bound, texts whose akshara counts already differ
+    by more are rejected before aligning, each line is only diffed once its plain edit
+    distance shows it may still fit, and the comparison stops as soon as the total goes
+    over the bound.
+
+    Args:
+        text1: The first text (usually the expert reading).
+        text2: The second text.
+        max_distance: Largest number of differing aksharas of interest.
+        max_rate: Largest difference rate of interest, as a fraction of the aksharas in text1.
+        align: If True, lines are aligned with align_lines() first, see diff_inscriptions().
+
+    Returns:
+        The distance, or None if it is over max_distance or max_rate.
     """
     lines1 = text1.splitlines()
     lines2 = text2.splitlines()
-    max_len = max(len(lines1), len(lines2))
-    results = []
-    total_differences = 0
-    comparison_results = []
-
-    for i in range(max_len):
-        line1 = lines1[i] if i < len(lines1) else ""
-        line2 = lines2[i] if i < len(lines2) else ""
-        cleaned_line1 = clean_inscription_text(line1)
-        cleaned_line2 = clean_inscription_text(line2)
-
-        inscription_1_tokens = tokenize_kannada(cleaned_line1, preserve_whitespace=True) 
-        inscription_2_tokens = tokenize_kannada(cleaned_line2, preserve_whitespace=True) 
-
-        differences_seq = get_levenshtein_diffs(inscription_1_tokens, inscription_2_tokens)
-
-        # Filter out empty tuples from differences_seq
-        differences_seq = [diff for diff in differences_seq if diff != ('', '')]
-
-        if not differences_seq:
-            results.append((cleaned_line1, cleaned_line2, "This line is the same in both inscriptions", 0))
-            highlighted_line2 = f"<span style='color:{color1}'>{cleaned_line2}</span>"
-            comparison_results.append((line1, line2, cleaned_line1, highlighted_line2, "", 0))
-        else:
-            edit_ops = Levenshtein.editops(inscription_1_tokens, inscription_2_tokens)
-            highlighted_line2 = ""
-            i, j = 0, 0
-            line_differences = 0
-
-            for op, i1, i2 in edit_ops:
-                while j < i2:
-                    highlighted_line2 += f"<span style='color:{color1}'>{inscription_2_tokens[j]}</span>"
-                    j += 1
-
-                if op == 'replace':
-                    replace_length = len(tokenize_kannada(inscription_1_tokens[i1])) 
-                    highlighted_line2 += f"<span style='color:{color2}'>{''.join(inscription_2_tokens[i2:i2 + replace_length])}</span>"
-                    i, j = i1 + 1, i2 + replace_length
-                    line_differences += replace_length
-                elif op == 'delete':
-                    i = i1 + 1
-                    line_differences += 1
-                elif op == 'insert':
-                    highlighted_line2 += f"<span style='color:{color2}'>{inscription_2_tokens[i2]}</span>"
-                    j = i2 + 1
-                    line_differences += 1
-
-            while j < len(inscription_2_tokens):
-                highlighted_line2 += f"<span style='color:{color1}'>{inscription_2_tokens[j]}</span>"
-                j += 1
-
-            formatted_differences = '; '.join([
-                f"""(<span style='color:{color1}'>{'&nbsp;' if not diff[0] else ''.join(diff[0])}</span>, <span style='color:{color2}'>{'&nbsp;' if not diff[1] else ''.join(diff[1])}</span>)"""
-                for diff in differences_seq
-            ])
-
-            total_differences += line_differences
-
-            results.append((cleaned_line1, highlighted_line2, formatted_differences, line_differences))
-            comparison_results.append((line1, line2, cleaned_line1, highlighted_line2, formatted_differences, line_differences))
-
-    return comparison_results, total_differences  
+    cleaned_lines1 = [clean_inscription_text(line) for line in lines1]
+    cleaned_lines2 = [clean_inscription_text(line) for line in lines2]
+    total_aksharas1 = sum(map(count_cleaned_aksharas, cleaned_lines1))
+    if max_rate is not None:
+        rate_distance = int(max_rate * total_aksharas1)
+        max_distance = rate_distance if max_distance is None else min(max_distance, rate_distance)
+    if max_distance is not None:
+        # Every akshara of text1 that text2 lacks is at least one difference. Aksharas text2 adds
+        # are too, except where they replace one of the spaces of text1 (one per line at most
+        # is added by joining split or merged lines).
+        total_aksharas2 = sum(map(count_cleaned_aksharas, cleaned_lines2))
+        spaces1 = sum(line.count(' ') for line in cleaned_lines1) + len(cleaned_lines1)
+        if max(total_aksharas1 - total_aksharas2, total_aksharas2 - total_aksharas1 - spaces1) > max_distance:
+            return None
+
+    if align:
+        line_alignment = align_lines(cleaned_lines1, cleaned_lines2)
+    else:
+        line_alignment = _pair_lines_by_index(len(lines1), len(lines2))
+
+    distance = 0
+    for _, i1, i2, j1, j2 in line_alignment:
+        cleaned_line1 = _aligned_cleaned_line(lines1, cleaned_lines1, i1, i2)
+        cleaned_line2 = _aligned_cleaned_line(lines2, cleaned_lines2, j1, j2)
+        if max_distance is not None:
+            # The plain edit distance only overcounts by the spaces of the first line replaced for free
+            tokens1 = tokenize_kannada(cleaned_line1, preserve_whitespace=True)
+            tokens2 = tokenize_kannada(cleaned_line2, preserve_whitespace=True)
+            free_replacements = sum(1 for token in tokens1 if token.isspace())
+            if bounded_edit_distance(tokens1, tokens2, max_distance - distance + free_replacements) is None:
+                return None
+        distance += _compare_cached_lines(cleaned_line1, cleaned_line2)[-1]
+        if max_distance is not None and distance > max_distance:
+            return None
+    return distance
+
+# A text split, cleaned and encoded once, for comparing it with many other texts. line_codes has
+# the code string of every cleaned line, from the vocabulary the reading was prepared with.
+PreparedReading = namedtuple('PreparedReading', ['lines', 'cleaned_lines', 'line_codes', 'total_aksharas'])
+
+def prepare_reading(text, vocabulary):
+    """
+    Cleans, tokenizes and encodes every line of a text once, returning a PreparedReading.
+
+    Readings compared with each other must share vocabulary, which should be one made for
+    those readings (see compare_readings()) rather than one that lives as long as the process.
+    """
+    lines = text.splitlines()
+    cleaned_lines = [clean_inscription_text(line) for line in lines]
+    line_codes = [vocabulary.encode(tokenize_kannada(line, preserve_whitespace=True)) for line in cleaned_lines]
+    return PreparedReading(lines, cleaned_lines, line_codes, sum(map(count_cleaned_aksharas, cleaned_lines)))
+
+def reading_distances(reading1, reading2, vocabulary, align=True):
+    """
+    Akshara edit distance of every aligned pair of lines of two prepared readings.
+
+    Only split or merged lines are tokenized again, so the cost is the alignment and
+    the edit distances. Both readings must have been prepared with vocabulary.
+
+    Returns:
+        A tuple containing:
+        - line_alignment: the (op, i1, i2, j1, j2) rows, as in diff_inscriptions().
+        - line_distances: the plain edit distance of each row, every akshara or space edited
+          counting once. inscription_distance() instead counts like the reported difference rate.
+    """
+    if align:
+        line_alignment = align_lines(reading1.cleaned_lines, reading2.cleaned_lines)
+    else:
+        line_alignment = _pair_lines_by_index(len(reading1.lines), len(reading2.lines))
+
+    line_distances = [Levenshtein.distance(_aligned_line_codes(reading1, i1, i2, vocabulary),
+                                           _aligned_line_codes(reading2, j1, j2, vocabulary))
+                      for _, i1, i2, j1, j2 in line_alignment]
+    return line_alignment, line_distances
+
+def _aligned_line_codes(reading, start, end, vocabulary):
+    if end - start == 1:
+        return reading.line_codes[start]
+    cleaned_line = _aligned_cleaned_line(reading.lines, reading.cleaned_lines, start, end)
+    return vocabulary.encode(tokenize_kannada(cleaned_line, preserve_whitespace=True))
+
+def _pair_lines_by_index(num_lines1, num_lines2):
+    line_alignment = []
+    for i in range(max(num_lines1, num_lines2)):
+        op = 'replace' if i < num_lines1 and i < num_lines2 else 'delete' if i < num_lines1 else 'insert'
+        line_alignment.append((op, min(i, num_lines1), min(i + 1, num_lines1), min(i, num_lines2), min(i + 1, num_lines2)))
+    return line_alignment
+
+def highlighted_spans(line_diff):
+    """
+    Returns the (start, end, differs) spans of the cleaned second line, in order, differs being
+    True for the aksharas that are shown as different. A replaced akshara highlights as many
+    aksharas as it has once split on its own.
+    """
+    cleaned_line2 = line_diff.cleaned_line2
+    if not line_diff.differences:
+        return [(0, len(cleaned_line2), False)]
+
+    # Spans are cut at akshara boundaries of the cleaned line instead of re-joining tokens
+    boundaries2 = akshara_boundaries(cleaned_line2)
+    num_tokens2 = len(line_diff.tokens2)
+    spans = []
+    j = 0
+    for op, i1, i2 in line_diff.edit_ops:
+        if j < i2:
+            spans.append((boundaries2[j], boundaries2[i2], False))
+            j = i2
+
+        if op == 'replace':
+            replace_length = _akshara_width(line_diff.tokens1[i1])
+            spans.append((boundaries2[i2], boundaries2[min(i2 + replace_length, num_tokens2)], True))
+            j = i2 + replace_length
+        elif op == 'insert':
+            spans.append((boundaries2[i2], boundaries2[i2 + 1], True))
+            j = i2 + 1
+
+    if j < num_tokens2:
+        spans.append((boundaries2[j], len(cleaned_line2), False))
+    return spans
+
+def render_highlighted_line(line_diff, color1, color2):
+    """Returns the cleaned second line as HTML, unchanged aksharas in color1 and differing ones in color2."""
+    cleaned_line2 = line_diff.cleaned_line2
+    return ''.join(f"<span style='color:{color2 if differs else color1}'>{cleaned_line2[start:end]}</span>"
+                   for start, end, differs in highlighted_spans(line_diff))
+
+def render_highlighted_input_line(line_diff, color1, color2):
+    """
+    Returns the second line as typed, as HTML, with the highlights of render_highlighted_line()
+    drawn on it through the offsets of clean_inscription_text_with_offsets(). Text the cleaner
+    dropped (brackets, special characters, extra whitespace) is left uncolored, and line breaks
+    of split or merged lines become <br>.
+    """
+    line2 = line_diff.line2
+    cleaned_line2, offsets = clean_inscription_text_with_offsets(line2)
+    if cleaned_line2 != line_diff.cleaned_line2:
+        # Not cleaned from this text (a diff built by hand), there is nothing to map back
+        return html.escape(line2).replace('\n', '<br>')
+
+    parts = []
+    position = 0
+    for start, end, differs in highlighted_spans(line_diff):
+        color = color2 if differs else color1
+        # Every run of cleaned characters that is also a run in the input is colored as one span
+        run_start = start
+        while run_start < end:
+            run_end = run_start + 1
+            while run_end < end and offsets[run_end] == offsets[run_end - 1] + 1:
+                run_end += 1
+            input_start, input_end = max(offsets[run_start], position), offsets[run_end - 1] + 1
+            if input_start < input_end:
+                parts.append(html.escape(line2[position:input_start]))
+                parts.append(f"<span style='color:{color}'>{html.escape(line2[input_start:input_end])}</span>")
+                position = input_end
+            run_start = run_end
+    parts.append(html.escape(line2[position:]))
+    return ''.join(parts).replace('\n', '<br>')
+
+def render_differences(line_diff, color1, color2):
+    """Returns the differing akshara pairs of a line as HTML, or an empty string if there are none."""
+    return '; '.join([
+        f"(<span style='color:{color1}'>{akshara1 or '&nbsp;'}</span>, <span style='color:{color2}'>{akshara2 or '&nbsp;'}</span>)"
+        for akshara1, akshara2 in line_diff.differences
+    ])
+
+def inscription_diff_to_dict(inscription_diff):
+    """Returns an InscriptionDiff as plain lists and dicts, ready for JSON."""
+    return {
+        'total_differences': inscription_diff.total_differences,
+        'lines': [
+            {
+                'alignment': op,
+                'lines1': [i1 + 1, i2],
+                'lines2': [j1 + 1, j2],
+                'cleaned_line1': line_diff.cleaned_line1,
+                'cleaned_line2': line_diff.cleaned_line2,
+                'tokens1': line_diff.tokens1,
+                'tokens2': line_diff.tokens2,
+                'edit_ops': [list(edit_op) for edit_op in line_diff.edit_ops] if line_diff.differences else [],
+                'differences': [list(diff) for diff in line_diff.differences],
+                'line_differences': line_diff.line_differences,
+            }
+            for line_diff, (op, i1, i2, j1, j2) in zip(inscription_diff.line_diffs, inscription_diff.line_alignment)
+        ],
+    }
+
+def render_inscription_diff_text(inscription_diff):
+    """Returns a plain text report of an InscriptionDiff, listing only the lines that differ."""
+    report = []
+    for line_diff, (op, i1, i2, j1, j2) in zip(inscription_diff.line_diffs, inscription_diff.line_alignment):
+        if not line_diff.differences:
+            continue
+        pairs = '; '.join(f"{akshara1 or '-'} > {akshara2 or '-'}" for akshara1, akshara2 in line_diff.differences)
+        report.append(f"{line_range(i1, i2)} / {line_range(j1, j2)} ({op}): {line_diff.line_differences} differences: {pairs}")
+    report.append(f"Total differences: {inscription_diff.total_differences}")
+    return '\n'.join(report)
+
+def line_range(start, end):
+    """Returns the line numbers (from 1) of lines[start:end] as a label, e.g. '3', '3-4', or '-' for no line."""
+    if end - start > 1:
+        return f"{start + 1}-{end}"
+    return str(end) if end > start else '-'
+
+# Compare lines with highlighting 
+def compare_and_highlight_lines(text1, text2, color1, color2, align=True):
+    """
+    Compares two Kannada texts line by line, highlighting differences.
+    Lines are aligned first unless align is False, see diff_inscriptions().
+    """
+    inscription_diff = diff_inscriptions(text1, text2, align)
+    comparison_results = [
+        (line_diff.line1, line_diff.line2, line_diff.cleaned_line1, render_highlighted_line(line_diff, color1, color2),
+         render_differences(line_diff, color1, color2), line_diff.line_differences)
+        for line_diff in inscription_diff.line_diffs
+    ]
+    return comparison_results, inscription_diff.total_differences  
+
+# Akshara offsets 
+def tokenize_kannada_spans(text, preserve_whitespace=False):
+    """Returns the (start, end) offset of every token tokenize_kannada() would return for text."""
+    return list(iter_akshara_spans(text, preserve_whitespace))
 
 # Process text for akshara count 
 def count_aksharas_per_line(text):
@@ -205,24 +691,154 @@ def count_aksharas_per_line(text):
         - num_lines: the number of lines in the text.
     """
     lines = text.splitlines()
-    total_aksharas = 0
-    line_akshara_counts = []
-    for line in lines:
-        if line.strip():
-            cleaned_line = clean_inscription_text(line)
-            # Split the cleaned line into words, treating whitespace and the pipe symbol '|' as delimiters. 
-            # The pipe symbol is likely used to mark specific separations or boundaries within the inscription text
-            words = re.split(r'(\s+|\|)', cleaned_line)
-            word_tokens = []
-            for word in words:
-                if word.strip() and word != '|':
-                    word_tokens.extend(tokenize_kannada(word))  
-                elif word == '|':
-                    word_tokens.append(word)
-            akshara_count = len([token for token in word_tokens if token.strip()])
-            line_akshara_counts.append(akshara_count)
-            total_aksharas += akshara_count
-    return line_akshara_counts, total_aksharas, len(lines)
+    akshara_counts = _line_akshara_counts(lines)
+    return akshara_counts.tolist(), sum(akshara_counts), len(lines)
+
+def line_akshara_counts(text):
+    """Returns the akshara count of every line of text that is not blank, as an array of unsigned ints."""
+    return _line_akshara_counts(text.splitlines())
+
+def _line_akshara_counts(lines):
+    return array('I', [count_cleaned_aksharas(clean_inscription_text(line)) for line in lines if line.strip()])
+
+class _BracketStripper:
+    """Streaming form of re.sub(r'\[.*?\]', '', line) for one pair of brackets, fed a line piece by piece."""
+
+    def __init__(self, opening, closing):
+        self.opening = opening
+        self.closing = closing
+        self._pending = None
+
+    def feed(self, text):
+        """Returns the part of text that is outside brackets, holding back a bracket not closed yet."""
+        kept = []
+        position = 0
+        while True:
+            if self._pending is None:
+                start = text.find(self.opening, position)
+                if start < 0:
+                    kept.append(text[position:])
+                    break
+                kept.append(text[position:start])
+                self._pending = [self.opening]
+                position = start + 1
+            else:
+                end = text.find(self.closing, position)
+                if end < 0:
+                    self._pending.append(text[position:])
+                    break
+                self._pending = None
+                position = end + 1
+        return ''.join(kept)
+
+    def end_line(self):
+        """Returns the text held back at the end of a line, where an unclosed bracket is kept as it is."""
+        pending, self._pending = self._pending, None
+        return ''.join(pending) if pending else ''
+
+def _iter_line_pieces(chunks):
+    # Yields (piece, line_ended) pairs, splitting lines exactly where str.splitlines() would
+    line_break = re.compile(LINE_BREAK_REGEX)
+    line_open = False
+    after_carriage_return = False
+    for chunk in chunks:
+        if after_carriage_return and chunk[0] == '\n':
+            # The second half of a \r\n that straddles two chunks
+            chunk = chunk[1:]
+        position = 0
+        for match in line_break.finditer(chunk):
+            yield chunk[position:match.start()], True
+            position = match.end()
+        after_carriage_return = chunk[-1:] == '\r'
+        line_open = position < len(chunk)
+        if line_open:
+            yield chunk[position:], False
+    if line_open:
+        yield '', True
+
+class LineSplitter:
+    """
+    Splits text that arrives in chunks (e.g. a request body) into lines, exactly where
+    str.splitlines() would. Only the line that is still open is held back.
+    """
+
+    def __init__(self):
+        self._line_break = re.compile(LINE_BREAK_REGEX)
+        self._open_line = []
+        self._after_carriage_return = False
+
+    def feed(self, chunk):
+        """Returns the lines that chunk completes, without their line breaks."""
+        if not chunk:
+            return []
+        if self._after_carriage_return and chunk[0] == '\n':
+            # The second half of a \r\n that straddles two chunks
+            chunk = chunk[1:]
+        lines = []
+        position = 0
+        for match in self._line_break.finditer(chunk):
+            self._open_line.append(chunk[position:match.start()])
+            lines.append(''.join(self._open_line))
+            self._open_line = []
+            position = match.end()
+        self._after_carriage_return = chunk[-1:] == '\r'
+        if position < len(chunk):
+            self._open_line.append(chunk[position:])
+        return lines
+
+    def close(self):
+        """Returns the last line as a list of one line if the text did not end with a line break, else []."""
+        lines = [''.join(self._open_line)] if self._open_line else []
+        self._open_line = []
+        return lines
+
+# Stream akshara counts 
+def iter_line_counts(file_like, chunk_size=CHUNK_SIZE, blank_lines=False):
+    """
+    Counts aksharas line by line while reading a file (or stdin) in fixed-size chunks.
+
+    Lines are cleaned and counted as they stream past, so a line is never held
+    in memory as a whole (except for text inside a bracket that is still open),
+    and an akshara cut in two by a chunk boundary is only counted once it is
+    complete. The counts match count_aksharas_per_line(file_like.read()).
+
+    Args:
+        file_like: A text or binary (UTF-8) file object.
+        chunk_size: Number of characters (or bytes) read at a time.
+        blank_lines: If True, blank lines are yielded as well, with a count of 0.
+
+    Yields:
+        A (line_number, akshara_count) tuple for every line that is not blank,
+        line numbers starting at 1.
+    """
+    special_chars = re.compile(SPECIAL_CHARS_REGEX)
+    square_brackets, round_brackets = _BracketStripper('[', ']'), _BracketStripper('(', ')')
+    line_number = 1
+    akshara_count = 0
+    has_text = False
+    carry = ''
+
+    for piece, line_ended in _iter_line_pieces(iter_text_chunks(file_like, chunk_size)):
+        has_text = has_text or not piece.isspace() and piece != ''
+        cleaned = round_brackets.feed(square_brackets.feed(piece))
+        if line_ended:
+            cleaned += round_brackets.feed(square_brackets.end_line()) + round_brackets.end_line()
+        text = carry + special_chars.sub('', cleaned)
+
+        if not line_ended:
+            # Hold back the last akshara, the next piece may add marks to it
+            cut = last_akshara_start(text)
+            akshara_count += count_cleaned_aksharas(text[:cut])
+            carry = text[cut:]
+            continue
+
+        akshara_count += count_cleaned_aksharas(text)
+        if has_text or blank_lines:
+            yield line_number, akshara_count
+        line_number += 1
+        akshara_count = 0
+        has_text = False
+        carry = ''
 
 df = None
 misread_dict = None
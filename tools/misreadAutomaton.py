@@ -0,0 +1,72 @@
+from collections import deque, namedtuple
+
+from tools.aksharaTokenizer import tokenize_aksharas
+
+# One occurrence of a pattern: tokens[start:end] of the searched token list are the aksharas of pattern
+AutomatonMatch = namedtuple('AutomatonMatch', ['start', 'end', 'pattern'])
+
+class AksharaAutomaton:
+    """
+    Aho-Corasick automaton over akshara sequences.
+
+    Every pattern is split into aksharas, and all occurrences of every pattern, of any
+    length and overlapping or not, are found in one pass over a token list. The cost
+    of a search does not grow with the number of patterns. Read-only once built, so
+    one automaton can be shared by any number of threads.
+    """
+
+    def __init__(self, patterns=()):
+        # State 0 is the root, every other state is a prefix of one or more patterns
+        self._transitions = [{}]
+        self._failures = [0]
+        # (pattern, length in aksharas) of every pattern that ends in a state, longest first
+        self._outputs = [()]
+        self.patterns = []
+        for pattern in patterns:
+            self._add(pattern)
+        self._link()
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def _add(self, pattern):
+        aksharas = tokenize_aksharas(pattern) if isinstance(pattern, str) else []
+        if not aksharas:
+            return
+        state = 0
+        for akshara in aksharas:
+            next_state = self._transitions[state].get(akshara)
+            if next_state is None:
+                next_state = self._transitions[state][akshara] = len(self._transitions)
+                self._transitions.append({})
+                self._failures.append(0)
+                self._outputs.append(())
+            state = next_state
+        self._outputs[state] += ((pattern, len(aksharas)),)
+        self.patterns.append(pattern)
+
+    def _link(self):
+        # Breadth first, so the failure state of every state is done before the state itself
+        queue = deque(self._transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for akshara, next_state in self._transitions[state].items():
+                failure = self._failures[state]
+                while failure and akshara not in self._transitions[failure]:
+                    failure = self._failures[failure]
+                failure = self._transitions[failure].get(akshara, 0)
+                self._failures[next_state] = failure
+                self._outputs[next_state] = tuple(sorted(self._outputs[next_state] + self._outputs[failure],
+                                                         key=lambda output: -output[1]))
+                queue.append(next_state)
+
+    def iter_matches(self, tokens):
+        """Yields an AutomatonMatch for every occurrence of a pattern in tokens, by end position, longest first."""
+        transitions, failures, outputs = self._transitions, self._failures, self._outputs
+        state = 0
+        for index, token in enumerate(tokens):
+            while state and token not in transitions[state]:
+                state = failures[state]
+            state = transitions[state].get(token, 0)
+            for pattern, length in outputs[state]:
+                yield AutomatonMatch(index + 1 - length, index + 1, pattern)
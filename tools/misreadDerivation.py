@@ -0,0 +1,126 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from tools.kannadaTools import (DATA_FILE_URL, MisreadIndex, diff_inscriptions, get_corpus_version, iter_distinct_rows,
+                                iter_workbook_rows, read_workbook_bytes)
+from tools.batchTools import DEFAULT_CHUNK_SIZE
+
+# Constants
+LINE_COLUMNS = ('Inscription_Name', 'Expert_Reading', 'Our_Reading')
+DEFAULT_DERIVED_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mythic_society.derived.idx')
+
+# One (misread, correction) pair as counted in the curated columns and in the readings.
+# status is 'both', 'added' (only found in the readings) or 'missing' (only curated).
+MisreadPairDiff = namedtuple('MisreadPairDiff', ['misread', 'correction', 'curated_count', 'derived_count', 'status'])
+
+def row_misread_pairs(expert_reading, our_reading):
+    """
+    Returns the (misread, correction) pairs of one row, in the orientation of the curated
+    columns: the akshara of Expert_Reading first, the akshara of Our_Reading second.
+
+    Only aksharas replaced by another akshara are paired, missing or extra aksharas are not.
+    """
+    pairs = []
+    for line_diff in diff_inscriptions(expert_reading, our_reading).line_diffs:
+        for expert_akshara, our_akshara in line_diff.differences:
+            # Tokens keep the whitespace before them, a pair that only differs in spacing is no misread
+            expert_akshara, our_akshara = expert_akshara.strip(), our_akshara.strip()
+            if expert_akshara and our_akshara and expert_akshara != our_akshara:
+                pairs.append((expert_akshara, our_akshara))
+    return pairs
+
+def _row_misread_pairs(readings):
+    return row_misread_pairs(*readings)
+
+def derive_misread_pairs(workbook_bytes, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Counts (misread, correction) pairs by aligning Expert_Reading with Our_Reading in every distinct line, on a process pool.
+
+    The workbook repeats a line once for every curated misread pair on it. Each distinct
+    (Inscription_Name, Expert_Reading, Our_Reading) line is aligned once, so that a pair is
+    counted once per line it is found on, like the curated counts.
+
+    Args:
+        workbook_bytes: Raw bytes of the inscription workbook.
+        workers: Number of worker processes, defaults to the number of CPUs. 1 aligns in this process.
+        chunk_size: Number of lines sent to a worker at a time.
+
+    Returns:
+        A {(misread, correction): count} dict in the order pairs are first seen, like count_misread_pairs().
+    """
+    readings = [(expert_reading, our_reading)
+                for _, expert_reading, our_reading in iter_distinct_rows(iter_workbook_rows(workbook_bytes, LINE_COLUMNS))
+                if isinstance(expert_reading, str) and isinstance(our_reading, str)]
+    if workers == 1:
+        row_pairs = map(_row_misread_pairs, readings)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            row_pairs = list(executor.map(_row_misread_pairs, readings, chunksize=chunk_size))
+
+    pair_counts = {}
+    for pairs in row_pairs:
+        for pair in pairs:
+            pair_counts[pair] = pair_counts.get(pair, 0) + 1
+    return pair_counts
+
+def derive_misread_index(workbook_bytes, workers=None):
+    """Builds a MisreadIndex from the readings of the workbook instead of its curated columns."""
+    return MisreadIndex(get_corpus_version(workbook_bytes), derive_misread_pairs(workbook_bytes, workers))
+
+def diff_misread_pairs(curated_pair_counts, derived_pair_counts):
+    """
+    Compares curated pair counts with derived ones.
+
+    Returns:
+        A list of MisreadPairDiff for every pair in either, most frequent derived pairs first,
+        then the pairs that were only curated, most frequent first.
+    """
+    pair_diffs = []
+    for pair in {**derived_pair_counts, **curated_pair_counts}:
+        curated_count, derived_count = curated_pair_counts.get(pair, 0), derived_pair_counts.get(pair, 0)
+        status = 'both' if curated_count and derived_count else 'added' if derived_count else 'missing'
+        pair_diffs.append(MisreadPairDiff(*pair, curated_count, derived_count, status))
+    pair_diffs.sort(key=lambda pair_diff: (-pair_diff.derived_count, -pair_diff.curated_count))
+    return pair_diffs
+
+def write_pair_diff_csv(pair_diffs, output):
+    """Writes one CSV row per pair."""
+    writer = csv.writer(output)
+    writer.writerow(MisreadPairDiff._fields)
+    writer.writerows(pair_diffs)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Derive misread pairs from the two readings of every line and compare them with the curated ones.")
+    parser.add_argument('--workbook', default=DATA_FILE_URL, help="URL or path of the inscription workbook")
+    parser.add_argument('--output', default=DEFAULT_DERIVED_INDEX_PATH, help="where to write the derived misread index")
+    parser.add_argument('--diff', help="CSV file to write the comparison with the curated pairs to (default: stdout)")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    args = parser.parse_args(argv)
+
+    workbook_bytes = read_workbook_bytes(args.workbook)
+    start = time.perf_counter()
+    derived_index = derive_misread_index(workbook_bytes, args.workers)
+    elapsed = time.perf_counter() - start
+    derived_index.save(args.output)
+
+    curated_index = MisreadIndex.from_workbook(workbook_bytes)
+    pair_diffs = diff_misread_pairs(curated_index.pair_counts, derived_index.pair_counts)
+    if args.diff:
+        with open(args.diff, 'w', encoding='utf-8', newline='') as output:
+            write_pair_diff_csv(pair_diffs, output)
+    else:
+        write_pair_diff_csv(pair_diffs, sys.stdout)
+
+    statuses = [pair_diff.status for pair_diff in pair_diffs]
+    print(f"Derived misread index {derived_index.corpus_version} at {args.output}: {len(derived_index.pair_counts)} pairs "
+          f"({statuses.count('both')} also curated, {statuses.count('added')} new, {statuses.count('missing')} curated only) "
+          f"in {elapsed:.2f}s", file=sys.stderr)
+
+# Entry point when the module is executed as a script
+if __name__ == "__main__":
+    main()
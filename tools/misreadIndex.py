@@ -0,0 +1,329 @@
+import argparse
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import namedtuple
+from collections.abc import Mapping
+from types import MappingProxyType
+
+import pandas as pd
+
+from tools.misreadAutomaton import AksharaAutomaton
+from tools.workbookReader import DATA_FILE_URL, iter_workbook_rows, read_workbook_bytes, get_corpus_version
+
+# Constants
+MISREAD_COLUMN = 'different_aksharas_in_sentence1'
+CORRECTION_COLUMN = 'different_aksharas_in_sentence2'
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'mythic_society.misread.idx')
+
+# Binary layout of the index file (little endian):
+#   header   magic, format version, corpus version, string count, pair count, string blob size
+#   strings  NUL separated, each prefixed with a type tag (s = text, i = integer, f = float)
+#   pairs    three uint32 arrays: misread string ids, correction string ids, pair counts
+INDEX_MAGIC = b'KTMI'
+INDEX_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sH16sIII')
+
+def count_misread_pairs(dataframe):
+    """Counts (misread, correction) pairs in one grouped pass, keeping the order in which pairs are first seen."""
+    pairs = dataframe[[MISREAD_COLUMN, CORRECTION_COLUMN]].dropna()
+    pair_sizes = pairs.groupby([MISREAD_COLUMN, CORRECTION_COLUMN], sort=False).size()
+    return dict(zip(pair_sizes.index, pair_sizes.tolist()))
+
+def build_misread_dict(pair_counts):
+    """
+    Groups pair counts into a read-only {misread: (corrections, ...)} mapping.
+
+    Corrections are ranked by how often the pair occurs, ties keep the order
+    in which the pairs were first seen.
+    """
+    grouped = {}
+    for (misread_akshara, corrected_akshara), count in pair_counts.items():
+        grouped.setdefault(misread_akshara, []).append((count, corrected_akshara))
+
+    misread_dict = {}
+    for misread_akshara, corrections in grouped.items():
+        corrections.sort(key=lambda correction: -correction[0])
+        misread_dict[misread_akshara] = tuple(corrected_akshara for _, corrected_akshara in corrections)
+    return MappingProxyType(misread_dict)
+
+# One ranked correction of a misread akshara: how often the pair was seen, and that count
+# as a fraction of all the corrections seen for the misread akshara
+ScoredCorrection = namedtuple('ScoredCorrection', ['correction', 'count', 'probability'])
+
+class ConfusionMatrix(Mapping):
+    """
+    Sparse akshara confusion matrix with the pair counts, in compressed sparse row form.
+
+    Misread aksharas (rows) and corrections (columns) are numbered in one table of
+    akshara ids. The corrections of row r are columns[row_starts[r]:row_starts[r + 1]],
+    most frequent first (ties in the order the pairs were first seen), and their counts
+    are the same slice of counts. Finding a row is one dict lookup.
+
+    Reads like a {misread: (ScoredCorrection, ...)} mapping, so it can be passed to
+    predict_misreads() in place of the misread dictionary.
+    """
+
+    def __init__(self, pair_counts):
+        self.aksharas = []
+        self.akshara_ids = {}
+        self.row_ids = {}
+        self.row_starts = array('I', [0])
+        self.columns = array('I')
+        self.counts = array('I')
+        self.row_totals = array('I')
+        self._scored_rows = {}
+
+        grouped = {}
+        for (misread_akshara, corrected_akshara), count in pair_counts.items():
+            grouped.setdefault(self._akshara_id(misread_akshara), []).append((count, self._akshara_id(corrected_akshara)))
+        for misread_id, corrections in grouped.items():
+            corrections.sort(key=lambda correction: -correction[0])
+            self.row_ids[self.aksharas[misread_id]] = len(self.row_totals)
+            self.columns.extend(correction_id for _, correction_id in corrections)
+            self.counts.extend(count for count, _ in corrections)
+            self.row_starts.append(len(self.columns))
+            self.row_totals.append(sum(count for count, _ in corrections))
+
+    def _akshara_id(self, akshara):
+        akshara_id = self.akshara_ids.get(akshara)
+        if akshara_id is None:
+            akshara_id = self.akshara_ids[akshara] = len(self.aksharas)
+            self.aksharas.append(akshara)
+        return akshara_id
+
+    def __getitem__(self, misread_akshara):
+        if misread_akshara not in self.row_ids:
+            raise KeyError(misread_akshara)
+        return self.top_corrections(misread_akshara)
+
+    def __iter__(self):
+        return iter(self.row_ids)
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def top_corrections(self, misread_akshara, k=None):
+        """Returns the k (default: all) most frequent corrections of an akshara as ScoredCorrection tuples."""
+        scored_row = self._scored_rows.get(misread_akshara)
+        if scored_row is None:
+            row = self.row_ids.get(misread_akshara)
+            if row is None:
+                return ()
+            scored_row = self._scored_rows[misread_akshara] = self._score_row(row)
+        return scored_row[:k]
+
+    def _score_row(self, row):
+        # Built once per row on first use, the same tuple is handed to every caller after that
+        start, end = self.row_starts[row], self.row_starts[row + 1]
+        aksharas, total = self.aksharas, self.row_totals[row]
+        return tuple(ScoredCorrection(aksharas[column], count, count / total)
+                     for column, count in zip(self.columns[start:end], self.counts[start:end]))
+
+    def transposed(self):
+        """Returns the matrix with misreads and corrections swapped, to go from a correction back to what it corrects."""
+        pair_counts = {}
+        for misread_akshara, row in self.row_ids.items():
+            start, end = self.row_starts[row], self.row_starts[row + 1]
+            for column, count in zip(self.columns[start:end], self.counts[start:end]):
+                pair_counts[(self.aksharas[column], misread_akshara)] = count
+        return ConfusionMatrix(pair_counts)
+
+    def count(self, misread_akshara, corrected_akshara):
+        """Returns how often misread_akshara was corrected to corrected_akshara."""
+        row = self.row_ids.get(misread_akshara)
+        column = self.akshara_ids.get(corrected_akshara)
+        if row is None or column is None:
+            return 0
+        for index in range(self.row_starts[row], self.row_starts[row + 1]):
+            if self.columns[index] == column:
+                return self.counts[index]
+        return 0
+
+    def probability(self, misread_akshara, corrected_akshara):
+        """Returns P(corrected_akshara | misread_akshara), 0.0 for an akshara never seen misread."""
+        row = self.row_ids.get(misread_akshara)
+        if row is None:
+            return 0.0
+        return self.count(misread_akshara, corrected_akshara) / self.row_totals[row]
+
+def _encode_value(value):
+    if isinstance(value, str):
+        return b's' + value.encode('utf-8')
+    if isinstance(value, int):
+        return b'i' + str(value).encode('ascii')
+    return b'f' + repr(float(value)).encode('ascii')
+
+def _decode_value(entry):
+    tag, body = entry[:1], entry[1:].decode('utf-8')
+    if tag == b's':
+        return body
+    if tag == b'i':
+        return int(body)
+    return float(body)
+
+def _to_little_endian(values):
+    if sys.byteorder != 'little':
+        values = array('I', values)
+        values.byteswap()
+    return values.tobytes()
+
+class MisreadIndex:
+    """
+    Compiled form of the misread dictionary.
+
+    Holds the (misread, correction) pair counts of one version of the
+    inscription workbook, identified by its content hash.
+    """
+
+    def __init__(self, corpus_version, pair_counts):
+        self.corpus_version = corpus_version
+        self.pair_counts = pair_counts
+        self._misread_dict = None
+        self._confusion_matrix = None
+        self._misread_automaton = None
+        self._reverse_confusion_matrix = None
+
+    @property
+    def misread_dict(self):
+        """The read-only {misread: (corrections, ...)} mapping, corrections ranked by frequency."""
+        if self._misread_dict is None:
+            self._misread_dict = build_misread_dict(self.pair_counts)
+        return self._misread_dict
+
+    @property
+    def confusion_matrix(self):
+        """The ConfusionMatrix of the pair counts, for ranked and scored corrections."""
+        if self._confusion_matrix is None:
+            self._confusion_matrix = ConfusionMatrix(self.pair_counts)
+        return self._confusion_matrix
+
+    @property
+    def reverse_confusion_matrix(self):
+        """The transposed ConfusionMatrix, from each correction to the misread aksharas it was seen for."""
+        if self._reverse_confusion_matrix is None:
+            self._reverse_confusion_matrix = self.confusion_matrix.transposed()
+        return self._reverse_confusion_matrix
+
+    @property
+    def misread_automaton(self):
+        """AksharaAutomaton of the misread aksharas, to find keys of several aksharas in a sentence."""
+        if self._misread_automaton is None:
+            self._misread_automaton = AksharaAutomaton(self.misread_dict)
+        return self._misread_automaton
+
+    @classmethod
+    def from_workbook(cls, workbook_bytes):
+        """Builds the index from the raw bytes of the inscription workbook."""
+        columns = [MISREAD_COLUMN, CORRECTION_COLUMN]
+        dataframe = pd.DataFrame.from_records(iter_workbook_rows(workbook_bytes, columns), columns=columns)
+        return cls(get_corpus_version(workbook_bytes), count_misread_pairs(dataframe))
+
+    def save(self, path):
+        """Writes the index to path, replacing any previous file atomically."""
+        string_ids = {}
+        misread_ids, correction_ids, counts = array('I'), array('I'), array('I')
+        for (misread_akshara, corrected_akshara), count in self.pair_counts.items():
+            for value, ids in ((misread_akshara, misread_ids), (corrected_akshara, correction_ids)):
+                key = (type(value), value)
+                if key not in string_ids:
+                    string_ids[key] = len(string_ids)
+                ids.append(string_ids[key])
+            counts.append(count)
+
+        blob = b'\x00'.join(_encode_value(value) for _, value in string_ids)
+        header = _HEADER.pack(INDEX_MAGIC, INDEX_FORMAT_VERSION, self.corpus_version.encode('ascii'),
+                              len(string_ids), len(counts), len(blob))
+
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as index_file:
+            index_file.write(header)
+            index_file.write(blob)
+            for values in (misread_ids, correction_ids, counts):
+                index_file.write(_to_little_endian(values))
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Reads an index written by save(). Raises ValueError if the file is not a valid index."""
+        with open(path, 'rb') as index_file:
+            data = index_file.read()
+
+        if len(data) < _HEADER.size:
+            raise ValueError(f"{path} is not a misread index")
+        magic, format_version, corpus_version, num_strings, num_pairs, blob_size = _HEADER.unpack_from(data)
+        if magic != INDEX_MAGIC or format_version != INDEX_FORMAT_VERSION:
+            raise ValueError(f"{path} is not a misread index of format version {INDEX_FORMAT_VERSION}")
+        if len(data) != _HEADER.size + blob_size + 12 * num_pairs:
+            raise ValueError(f"{path} is truncated")
+
+        offset = _HEADER.size
+        strings = [_decode_value(entry) for entry in data[offset:offset + blob_size].split(b'\x00')] if num_strings else []
+        offset += blob_size
+
+        columns = []
+        for _ in range(3):
+            values = array('I')
+            values.frombytes(data[offset:offset + 4 * num_pairs])
+            if sys.byteorder != 'little':
+                values.byteswap()
+            columns.append(values)
+            offset += 4 * num_pairs
+
+        misread_ids, correction_ids, counts = columns
+        pair_counts = {(strings[m], strings[c]): n for m, c, n in zip(misread_ids, correction_ids, counts)}
+        return cls(corpus_version.decode('ascii'), pair_counts)
+
+def load_misread_index(workbook_source=DATA_FILE_URL, index_path=DEFAULT_INDEX_PATH, workbook_bytes=None):
+    """
+    Loads the compiled misread index, rebuilding it only when the workbook content changed.
+
+    Args:
+        workbook_source: URL or path of the inscription workbook.
+        index_path: Location of the compiled index file.
+        workbook_bytes: Already downloaded workbook content, used instead of workbook_source.
+
+    Returns:
+        A MisreadIndex matching the current workbook.
+    """
+    if workbook_bytes is None:
+        workbook_bytes = read_workbook_bytes(workbook_source)
+    corpus_version = get_corpus_version(workbook_bytes)
+
+    try:
+        index = MisreadIndex.load(index_path)
+        if index.corpus_version == corpus_version:
+            return index
+    except (OSError, ValueError):
+        pass
+
+    index = MisreadIndex.from_workbook(workbook_bytes)
+    try:
+        index.save(index_path)
+    except OSError:
+        # A read-only deployment still works, it just rebuilds on every cold start
+        pass
+    return index
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the inscription workbook into a misread index file.")
+    parser.add_argument('--workbook', default=DATA_FILE_URL, help="URL or path of the inscription workbook")
+    parser.add_argument('--output', default=DEFAULT_INDEX_PATH, help="where to write the index file")
+    parser.add_argument('--force', action='store_true', help="rebuild even if the index is up to date")
+    args = parser.parse_args(argv)
+
+    workbook_bytes = read_workbook_bytes(args.workbook)
+    if args.force and os.path.exists(args.output):
+        os.remove(args.output)
+
+    start = time.perf_counter()
+    index = load_misread_index(index_path=args.output, workbook_bytes=workbook_bytes)
+    elapsed = time.perf_counter() - start
+    print(f"Misread index {index.corpus_version} at {args.output}: {len(index.misread_dict)} misread aksharas, "
+          f"{len(index.pair_counts)} pairs, loaded in {elapsed:.2f}s")
+
+# Entry point when the module is executed as a script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import sys
+import time
+
+from tools.kannadaTools import DATA_FILE_URL, iter_misread_json_lines, load_misread_index, scan_misreads
+from tools.misreadIndex import DEFAULT_INDEX_PATH
+
+def write_occurrences_jsonl(occurrences, output, source):
+    """Writes one JSON object per occurrence and line. Returns the number written."""
+    written = 0
+    for line in iter_misread_json_lines(occurrences, source=source):
+        output.write(line)
+        written += 1
+    return written
+
+def write_occurrences_tsv(occurrences, output, source):
+    """Writes one tab separated row per occurrence: source, line, offset, misread and the corrections. Returns the number written."""
+    written = 0
+    for occurrence in occurrences:
+        corrections = ' '.join(f"{correction.correction}:{correction.probability:.2f}" if hasattr(correction, 'probability')
+                               else str(correction) for correction in occurrence.corrections)
+        output.write(f"{source}\t{occurrence.line}\t{occurrence.offset}\t{occurrence.misread}\t{corrections}\n")
+        written += 1
+    return written
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Proofread transcriptions, listing every potential misread akshara with its position as it is found.")
+    parser.add_argument('paths', nargs='*', default=['-'], help="transcription files, - for stdin (default)")
+    parser.add_argument('--workbook', default=DATA_FILE_URL, help="URL or path of the inscription workbook")
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH, help="location of the compiled misread index")
+    parser.add_argument('--scored', action='store_true', help="rank corrections with their counts and probabilities")
+    parser.add_argument('--top-k', type=int, default=None, help="corrections to list per misread (default: all)")
+    parser.add_argument('--format', choices=('jsonl', 'tsv'), default='jsonl')
+    args = parser.parse_args(argv)
+
+    misread_index = load_misread_index(args.workbook, args.index)
+    misread_dict = misread_index.confusion_matrix if args.scored else misread_index.misread_dict
+    write = write_occurrences_jsonl if args.format == 'jsonl' else write_occurrences_tsv
+
+    start = time.perf_counter()
+    found = 0
+    for path in args.paths:
+        if path == '-':
+            found += write(scan_misreads(sys.stdin, misread_dict, misread_index.misread_automaton, args.top_k), sys.stdout, path)
+            continue
+        with open(path, encoding='utf-8') as transcription_file:
+            found += write(scan_misreads(transcription_file, misread_dict, misread_index.misread_automaton, args.top_k), sys.stdout, path)
+    print(f"Found {found} potential misreads in {len(args.paths)} files in {time.perf_counter() - start:.2f}s", file=sys.stderr)
+
+# Entry point when the module is executed as a script
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import namedtuple
+
+from tools.kannadaTools import DATA_FILE_URL, load_expert_lexicon, load_misread_index, read_workbook_bytes, get_corpus_version
+
+# One loaded version of the misread dictionary, with its confusion matrices (misread to correction
+# and back) and automaton built once, and the lexicon of attested expert words.
+# Snapshots are never mutated, readers grab the current one and keep using it even if a reload
+# swaps it out.
+MisreadIndexSnapshot = namedtuple('MisreadIndexSnapshot', ['corpus_version', 'misread_dict', 'confusion_matrix',
+                                                           'reverse_confusion_matrix', 'misread_automaton',
+                                                           'expert_lexicon', 'loaded_at'])
+
+class MisreadIndexService:
+    """
+    Holds the process-wide misread dictionary shared by all request handlers.
+
+    The dictionary is loaded once from the compiled misread index and replaced
+    with a single reference assignment when the workbook content changes, so
+    handlers never see a half-built dictionary.
+    """
+
+    def __init__(self, source=DATA_FILE_URL):
+        self.source = source
+        self.last_error = None
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def ready(self):
+        """True once a misread dictionary has been loaded."""
+        return self._snapshot is not None
+
+    @property
+    def snapshot(self):
+        """Returns the current snapshot, raising RuntimeError while still loading."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise RuntimeError("The misread index has not been loaded yet")
+        return snapshot
+
+    def refresh(self):
+        """
+        Reloads the workbook and swaps in a new misread dictionary if its content changed.
+
+        Returns:
+            True if a new snapshot was installed, False if the corpus version was unchanged.
+        """
+        with self._refresh_lock:
+            try:
+                workbook_bytes = read_workbook_bytes(self.source)
+                corpus_version = get_corpus_version(workbook_bytes)
+                current = self._snapshot
+                if current is not None and current.corpus_version == corpus_version:
+                    return False
+
+                # Served from the compiled index and word counts unless the workbook changed since they were built
+                misread_index = load_misread_index(workbook_bytes=workbook_bytes)
+                self._snapshot = MisreadIndexSnapshot(corpus_version, misread_index.misread_dict,
+                                                      misread_index.confusion_matrix, misread_index.reverse_confusion_matrix,
+                                                      misread_index.misread_automaton,
+                                                      load_expert_lexicon(workbook_bytes=workbook_bytes), time.time())
+                self.last_error = None
+                return True
+            except Exception as e:
+                self.last_error = e
+                raise
+
+    def refresh_in_background(self):
+        """Starts a refresh on a daemon thread so that startup is not blocked by the download."""
+        def run():
+            try:
+                self.refresh()
+            except Exception:
+                # Kept in last_error and reported by the readiness check
+                pass
+
+        thread = threading.Thread(target=run, name="misread-index-refresh", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,184 @@
+from bisect import bisect_left
+from collections import Counter
+
+import Levenshtein
+
+# Line alignment costs. Pairing two lines costs their normalized edit distance
+# (0 for identical lines, 1 for lines with nothing in common), leaving a line
+# unpaired costs half of that, so two lines are paired unless they share nothing.
+# Splitting or merging lines costs a little extra so that 1:1 pairs win ties.
+UNPAIRED_LINE_COST = 0.5
+SPLIT_COST = 0.1
+# Lines more than this far off the diagonal of an unmatched block are not considered. The band
+# widens by the difference in length of the block, up to MAX_LINE_BAND, so that very uneven
+# blocks still cost O(MAX_LINE_BAND * n).
+LINE_BAND = 8
+MAX_LINE_BAND = 64
+# Two lines this close, followed by two lines this close, are paired without looking further
+SIMILAR_LINE_DISTANCE = 0.25
+
+def line_distance(line1, line2):
+    """Normalized edit distance between two lines, from 0 (identical) to 1."""
+    return 1.0 - Levenshtein.ratio(line1, line2)
+
+def bounded_edit_distance(seq1, seq2, max_distance=None):
+    """
+    Levenshtein distance between two strings (or sequences), giving up once it is over max_distance.
+
+    Levenshtein.distance() with a score cutoff only fills the band of the dynamic
+    program within max_distance of the diagonal and stops as soon as the bound is
+    exceeded, so this costs O(max_distance * n) instead of O(n * m).
+
+    Returns:
+        The distance, or None if it is over max_distance.
+    """
+    if max_distance is None:
+        return Levenshtein.distance(seq1, seq2)
+    if max_distance < 0 or abs(len(seq1) - len(seq2)) > max_distance:
+        return None
+    distance = Levenshtein.distance(seq1, seq2, score_cutoff=max_distance)
+    return distance if distance <= max_distance else None
+
+def align_lines(lines1, lines2):
+    """
+    Aligns two lists of lines, allowing lines to be missing, added, split or merged.
+
+    Lines that occur exactly once in each list and in the same order anchor the
+    alignment (as in patience diff). Between anchors, lines are paired as long
+    as they stay similar, and only where that breaks down are the lines aligned
+    by a dynamic program over line distances, in a band around the diagonal.
+    This keeps the cost close to linear for readings of the same text.
+
+    Returns:
+        A list of (op, i1, i2, j1, j2) rows in text order, meaning lines1[i1:i2]
+        goes with lines2[j1:j2]. op is 'equal' or 'replace' (one line each),
+        'delete' (a line of lines1 only), 'insert' (a line of lines2 only),
+        'split' (one line of lines1, two or more of lines2) or 'merge' (two
+        or more lines of lines1, one of lines2). Lines are only split or merged
+        in twos, except that a text of one line goes with all of the other text.
+    """
+    if len(lines1) == len(lines2) == 1:
+        return [('equal' if lines1 == lines2 else 'replace', 0, 1, 0, 1)]
+    if min(len(lines1), len(lines2)) == 1:
+        # A reading typed without line breaks has no lines to align, compare it with the whole other reading
+        return [('merge' if len(lines1) > 1 else 'split', 0, len(lines1), 0, len(lines2))]
+
+    rows = []
+    i, j = 0, 0
+    for anchor_i, anchor_j in (*_unique_line_anchors(lines1, lines2), (len(lines1), len(lines2))):
+        rows.extend(_align_similar_lines(lines1, lines2, i, anchor_i, j, anchor_j))
+        if anchor_i < len(lines1):
+            rows.append(('equal', anchor_i, anchor_i + 1, anchor_j, anchor_j + 1))
+        i, j = anchor_i + 1, anchor_j + 1
+    return rows
+
+def _unique_line_anchors(lines1, lines2):
+    # Longest increasing run of (i, j) pairs of lines that occur once in each list
+    counts1, counts2 = Counter(lines1), Counter(lines2)
+    positions2 = {line: j for j, line in enumerate(lines2) if counts2[line] == 1}
+    pairs = [(i, positions2[line]) for i, line in enumerate(lines1) if counts1[line] == 1 and line in positions2]
+
+    tails, tail_indexes, previous = [], [], [None] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        position = bisect_left(tails, j)
+        if position:
+            previous[index] = tail_indexes[position - 1]
+        if position == len(tails):
+            tails.append(j)
+            tail_indexes.append(index)
+        else:
+            tails[position] = j
+            tail_indexes[position] = index
+
+    anchors = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        anchors.append(pairs[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+def _align_similar_lines(lines1, lines2, i1, i2, j1, j2):
+    # Readings of the same text mostly differ inside lines. Pair lines as long as they and the
+    # lines after them are similar, and only run the dynamic program from where that stops
+    # to the next point where it holds again.
+    def similar(i, j):
+        if i == i2 or j == j2:
+            return i == i2 and j == j2
+        return line_distance(lines1[i], lines2[j]) <= SIMILAR_LINE_DISTANCE
+
+    rows = []
+    i, j = i1, j1
+    while i < i2 and j < j2:
+        if similar(i, j) and similar(i + 1, j + 1):
+            rows.append(('equal' if lines1[i] == lines2[j] else 'replace', i, i + 1, j, j + 1))
+            i, j = i + 1, j + 1
+            continue
+
+        resync = None
+        for step in range(1, 2 * LINE_BAND + 1):
+            for skipped1 in range(step + 1):
+                p, q = i + skipped1, j + step - skipped1
+                if p < i2 and q < j2 and similar(p, q) and similar(p + 1, q + 1):
+                    resync = (p, q)
+                    break
+            if resync:
+                break
+        p, q = resync or (i2, j2)
+        rows.extend(_align_block(lines1, lines2, i, p, j, q))
+        i, j = p, q
+
+    rows.extend(_align_block(lines1, lines2, i, i2, j, j2))
+    return rows
+
+def _align_block(lines1, lines2, i1, i2, j1, j2):
+    # Dynamic program over the prefixes of lines1[i1:i2] and lines2[j1:j2], in a band around the diagonal
+    n, m = i2 - i1, j2 - j1
+    # Wide enough for the rows of one line to overlap the rows of the next
+    band = max(min(LINE_BAND + abs(n - m), MAX_LINE_BAND), -(-m // max(n, 1)))
+    costs = {(0, 0): (0.0, None)}
+
+    def diagonal(i):
+        return i * m // n if n else 0
+
+    for i in range(n + 1):
+        center = diagonal(i)
+        for j in range(max(0, center - band), min(m, center + band) + 1):
+            if i == 0 and j == 0:
+                continue
+            best = None
+            candidates = []
+            if i and j:
+                candidates.append(((i - 1, j - 1), line_distance(lines1[i1 + i - 1], lines2[j1 + j - 1])))
+            if i:
+                candidates.append(((i - 1, j), UNPAIRED_LINE_COST))
+            if j:
+                candidates.append(((i, j - 1), UNPAIRED_LINE_COST))
+            if i and j >= 2:
+                joined = f"{lines2[j1 + j - 2]} {lines2[j1 + j - 1]}"
+                candidates.append(((i - 1, j - 2), line_distance(lines1[i1 + i - 1], joined) + SPLIT_COST))
+            if i >= 2 and j:
+                joined = f"{lines1[i1 + i - 2]} {lines1[i1 + i - 1]}"
+                candidates.append(((i - 2, j - 1), line_distance(joined, lines2[j1 + j - 1]) + SPLIT_COST))
+
+            for previous, step_cost in candidates:
+                if previous in costs:
+                    cost = costs[previous][0] + step_cost
+                    if best is None or cost < best[0]:
+                        best = (cost, previous)
+            if best is not None:
+                costs[(i, j)] = best
+
+    # Walk back from the end of the block
+    rows = []
+    i, j = n, m
+    while (i, j) != (0, 0):
+        previous_i, previous_j = costs[(i, j)][1]
+        shape = (i - previous_i, j - previous_j)
+        op = {(1, 1): 'replace', (1, 0): 'delete', (0, 1): 'insert', (1, 2): 'split', (2, 1): 'merge'}[shape]
+        if op == 'replace' and lines1[i1 + previous_i] == lines2[j1 + previous_j]:
+            op = 'equal'
+        rows.append((op, i1 + previous_i, i1 + i, j1 + previous_j, j1 + j))
+        i, j = previous_i, previous_j
+    rows.reverse()
+    return rows
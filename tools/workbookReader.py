@@ -0,0 +1,231 @@
+import hashlib
+import io
+import posixpath
+import re
+import urllib.request
+import zipfile
+from collections import namedtuple
+from xml.etree.ElementTree import iterparse, fromstring
+
+# Constants
+DATA_FILE_URL = "https://github.com/mythicsociety/KannadaTools/raw/94814a2766fd22e89e24976eded769d45a82560a/mythic_society%20(1).xlsx"
+INSCRIPTION_COLUMNS = (
+    'Inscription_Name',
+    'Expert_Reading',
+    'Our_Reading',
+    'different_aksharas_in_sentence1',
+    'different_aksharas_in_sentence2',
+    'Year',
+    'Surface Quality (Well dressed/Moderately Dressed/Poorly Dressed)',
+)
+
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PACKAGE_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_SHEET_DATA, _ROW, _CELL, _VALUE = f'{_MAIN_NS}sheetData', f'{_MAIN_NS}row', f'{_MAIN_NS}c', f'{_MAIN_NS}v'
+_SHARED_STRING, _TEXT, _RUN, _INLINE_STRING = f'{_MAIN_NS}si', f'{_MAIN_NS}t', f'{_MAIN_NS}r', f'{_MAIN_NS}is'
+_ESCAPED_CHAR_REGEX = re.compile(r'_x([0-9A-Fa-f]{4})_')
+_CELL_COLUMN_REGEX = re.compile(r'[A-Z]+')
+
+def read_workbook_bytes(source=DATA_FILE_URL):
+    """Reads the raw bytes of the inscription workbook from a URL or a local path."""
+    if re.match(r'https?://', source):
+        with urllib.request.urlopen(source) as response:
+            return response.read()
+    with open(source, 'rb') as workbook_file:
+        return workbook_file.read()
+
+def get_corpus_version(workbook_bytes):
+    """Returns a short content hash identifying one version of the inscription workbook."""
+    return hashlib.sha256(workbook_bytes).hexdigest()[:16]
+
+def _unescape(text):
+    # Excel stores control characters as _xHHHH_
+    if '_x' in text:
+        return _ESCAPED_CHAR_REGEX.sub(lambda match: chr(int(match.group(1), 16)), text)
+    return text
+
+def _string_item_text(element):
+    # Plain <t> or rich text runs <r><t>, phonetic hints (<rPh>) are skipped
+    parts = []
+    for child in element:
+        if child.tag == _TEXT:
+            parts.append(child.text or '')
+        elif child.tag == _RUN:
+            text = child.find(_TEXT)
+            if text is not None:
+                parts.append(text.text or '')
+    return _unescape(''.join(parts))
+
+def _column_index(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+def record_field_name(column):
+    """Turns a header such as 'Surface Quality (Well dressed/...)' into a record field name ('Surface_Quality')."""
+    return re.sub(r'\W+', '_', column.split(' (')[0]).strip('_')
+
+class _SharedStrings:
+    """Shared string table that is only parsed as far as the highest index looked up so far."""
+
+    def __init__(self, workbook, path):
+        self._strings = []
+        self._stream = workbook.open(path) if path in workbook.namelist() else None
+        self._events = iterparse(self._stream, events=('start', 'end')) if self._stream else None
+        self._root = None
+
+    def __getitem__(self, index):
+        while index >= len(self._strings):
+            if not self._advance():
+                raise IndexError(f"shared string {index} is not in the workbook")
+        return self._strings[index]
+
+    def _advance(self):
+        if self._events is None:
+            return False
+        for event, element in self._events:
+            if self._root is None:
+                self._root = element
+            elif event == 'end' and element.tag == _SHARED_STRING:
+                self._strings.append(_string_item_text(element))
+                self._root.clear()
+                return True
+        self.close()
+        return False
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+        self._stream = self._events = None
+
+def _first_sheet_paths(workbook):
+    # Resolve the first worksheet and the shared strings part through the workbook relationships
+    sheet_path, shared_strings_path = 'xl/worksheets/sheet1.xml', 'xl/sharedStrings.xml'
+    try:
+        sheets = fromstring(workbook.read('xl/workbook.xml')).find(f'{_MAIN_NS}sheets')
+        relationships = fromstring(workbook.read('xl/_rels/workbook.xml.rels'))
+    except KeyError:
+        return sheet_path, shared_strings_path
+
+    targets = {}
+    for relationship in relationships.iter(f'{_PACKAGE_REL_NS}Relationship'):
+        target = relationship.get('Target')
+        target = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+        targets[relationship.get('Id')] = target
+        if relationship.get('Type', '').endswith('/sharedStrings'):
+            shared_strings_path = target
+
+    if sheets is not None and len(sheets):
+        sheet_path = targets.get(sheets[0].get(f'{_REL_NS}id'), sheet_path)
+    return sheet_path, shared_strings_path
+
+def _cell_value(cell, shared_strings):
+    cell_type = cell.get('t', 'n')
+    if cell_type == 'inlineStr':
+        inline = cell.find(_INLINE_STRING)
+        return _string_item_text(inline) if inline is not None else None
+
+    value = cell.find(_VALUE)
+    if value is None or value.text is None:
+        return None
+    if cell_type == 's':
+        return shared_strings[int(value.text)]
+    if cell_type == 'str':
+        return _unescape(value.text)
+    if cell_type == 'b':
+        return value.text == '1'
+    if cell_type == 'e':
+        return None
+
+    # Whole numbers come back as int, the same as pandas.read_excel
+    number = float(value.text)
+    return int(number) if number.is_integer() else number
+
+def iter_workbook_rows(source=DATA_FILE_URL, columns=None):
+    """
+    Streams the rows of the first worksheet, keeping only the requested columns.
+
+    The sheet XML is parsed incrementally and shared strings are resolved on
+    demand, so memory use depends on the selected columns rather than on the
+    size of the whole sheet.
+
+    Args:
+        source: URL, local path, raw bytes or binary file object of an .xlsx workbook.
+        columns: Header names to keep, in the order they should appear in each record.
+            Defaults to every column of the header row.
+
+    Yields:
+        One namedtuple per data row. Field names come from record_field_name()
+        and missing cells are None.
+    """
+    if isinstance(source, str) and re.match(r'https?://', source):
+        source = read_workbook_bytes(source)
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    with zipfile.ZipFile(source) as workbook:
+        sheet_path, shared_strings_path = _first_sheet_paths(workbook)
+        shared_strings = _SharedStrings(workbook, shared_strings_path)
+        try:
+            with workbook.open(sheet_path) as sheet:
+                yield from _iter_sheet_rows(sheet, shared_strings, columns)
+        finally:
+            shared_strings.close()
+
+def _iter_sheet_rows(sheet, shared_strings, columns):
+    record_type = None
+    selected = None
+    sheet_data = None
+
+    for event, element in iterparse(sheet, events=('start', 'end')):
+        if event == 'start':
+            if element.tag == _SHEET_DATA:
+                sheet_data = element
+            continue
+        if element.tag != _ROW:
+            continue
+
+        # Map column position -> value, only decoding the cells that were asked for
+        cells = {}
+        for position, cell in enumerate(element.iter(_CELL)):
+            reference = cell.get('r')
+            column = _column_index(_CELL_COLUMN_REGEX.match(reference).group()) if reference else position
+            if selected is None or column in selected:
+                cells[column] = _cell_value(cell, shared_strings)
+        # Drop the parsed row so the tree never holds more than one row
+        sheet_data.clear()
+
+        if record_type is None:
+            header = {value: column for column, value in cells.items() if value is not None}
+            names = list(columns) if columns is not None else list(header)
+            missing = [name for name in names if name not in header]
+            if missing:
+                raise KeyError(f"Columns not found in the workbook header: {missing}")
+            selected = [header[name] for name in names]
+            record_type = namedtuple('InscriptionRow', [record_field_name(name) for name in names], rename=True)
+            continue
+
+        yield record_type._make(cells.get(column) for column in selected)
+
+def iter_distinct_rows(rows, key=None, consecutive=False):
+    """
+    Drops the rows that repeat an earlier row, keeping workbook order.
+
+    The workbook has one row per curated misread pair, so a line of an inscription is
+    repeated once for every pair found on it. Rows are compared on key(row), the whole
+    row by default. With consecutive=True a row is only dropped when it repeats the row
+    just before it, so a line that recurs further on in an inscription is kept.
+    """
+    seen = set()
+    previous = None
+    for index, row in enumerate(rows):
+        row_key = row if key is None else key(row)
+        if consecutive:
+            if not index or row_key != previous:
+                yield row
+            previous = row_key
+        elif row_key not in seen:
+            seen.add(row_key)
+            yield row